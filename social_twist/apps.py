@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class SocialTwistConfig(AppConfig):
     name = 'social_twist'
+
+    def ready(self):
+        # Registers the background jobs and the signal handlers enqueuing them.
+        import social_twist.tasks  # noqa: F401
+        # Registers the signal handlers dropping revoked tokens from the token cache.
+        import social_twist.authentication  # noqa: F401
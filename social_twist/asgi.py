@@ -0,0 +1,16 @@
+"""
+ASGI config for the websocket side of the project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP keeps being served by uWSGI through ``social_twist.wsgi``.
+"""
+
+import os
+
+import django
+from channels.routing import get_default_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_twist.settings")
+django.setup()
+
+application = get_default_application()
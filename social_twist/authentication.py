@@ -0,0 +1,123 @@
+"""
+OAuth2 authentication with cached token lookups.
+
+Looking a bearer token up costs a query joining the user on every single
+request. Valid tokens are cached instead, as (user id, scope, expiry), keyed by
+a hash of the token: first in a small LRU of every process, then in the shared
+cache. Only the user is loaded per request, along with its profile.
+
+Deleting an access token, which is how oauth2_provider revokes it, or changing
+it drops it from the shared cache and the LRU of the process doing it. Other
+processes notice within ``settings.AUTH_TOKEN_LOCAL_TTL`` seconds, as that's as
+long as their LRU entries live. Expired tokens are never let through.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import get_access_token_model
+
+AccessToken = get_access_token_model()
+
+
+class TokenCache(object):
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.AUTH_TOKEN_LOCAL_CACHE_SIZE
+        self.entries = OrderedDict()  # token hash -> (user id, scope, expires, cached until)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return 'oauth:token:%s' % hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """(user id, scope, expiry timestamp) of a valid token, None if it isn't one."""
+        key = self.key(token)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[3] > now and entry[2] > now:
+                    self.entries.move_to_end(key)
+                    return entry[:3]
+                del self.entries[key]
+
+        shared = caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+        entry = shared.get(key)
+        if entry is None:
+            entry = self.load(token)
+            if entry is None:
+                return None
+            shared.set(key, entry, min(entry[2] - now, settings.AUTH_TOKEN_CACHE_TIMEOUT))
+        if entry[2] <= now:
+            return None
+        with self.lock:
+            self.entries[key] = entry + (now + settings.AUTH_TOKEN_LOCAL_TTL,)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def load(token):
+        row = AccessToken.objects.filter(token=token, user__isnull=False)\
+            .values_list('user_id', 'scope', 'expires').first()
+        if row is None or row[2] <= timezone.now():
+            return None
+        return row[0], row[1], row[2].timestamp()
+
+    def forget(self, token):
+        key = self.key(token)
+        caches[settings.AUTH_TOKEN_CACHE_ALIAS].delete(key)
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+tokens = TokenCache()
+
+
+def authenticate_token(token):
+    """
+    Returns (user, access token) for a valid bearer token, with the user's profile
+    joined, or None. The access token isn't saved, but answers ``is_valid`` and
+    ``allow_scopes`` like the stored one.
+    """
+    entry = tokens.get(token)
+    if entry is None:
+        return None
+    user_id, scope, expires = entry
+    user = User.objects.select_related('info').filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return None
+    expires = datetime.datetime.fromtimestamp(expires, tz=timezone.utc)
+    return user, AccessToken(token=token, user=user, scope=scope, expires=expires)
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """OAuth2Authentication for ``Authorization: Bearer`` headers, with cached token lookups."""
+    def authenticate(self, request):
+        kind, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if kind.lower() != 'bearer' or not token.strip():
+            # Tokens sent any other way are left to oauthlib.
+            return super(CachedOAuth2Authentication, self).authenticate(request)
+        return authenticate_token(token.strip())
+
+
+@receiver(post_save, sender=AccessToken)
+@receiver(post_delete, sender=AccessToken)
+def access_token_changed(sender, instance, **kwargs):
+    # Right away for this process, and again once the change commits, in case
+    # a request reloaded the old token in between.
+    token = instance.token
+    tokens.forget(token)
+    transaction.on_commit(lambda: tokens.forget(token))
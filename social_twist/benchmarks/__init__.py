@@ -0,0 +1,87 @@
+"""
+Benchmark scenarios, run with ``./manage.py benchmark <scenario>``.
+
+A scenario is a function registered with ``@scenario(name)``. It seeds whatever
+it needs and reports timings through the ``report`` callback it is given.
+The command runs every scenario inside a transaction that is rolled back
+afterwards, so seeded data never outlives the run.
+"""
+import importlib
+import time
+import uuid
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from social_twist.models import CustomUserData
+
+MODULES = (
+    'social_twist.benchmarks.chat',
+    'social_twist.benchmarks.geo',
+    'social_twist.benchmarks.search',
+    'social_twist.benchmarks.people',
+    'social_twist.benchmarks.friends',
+    'social_twist.benchmarks.feed',
+    'social_twist.benchmarks.serialization',
+    'social_twist.benchmarks.auth',
+    'social_twist.benchmarks.batch',
+    'social_twist.benchmarks.connections',
+)
+
+SCENARIOS = OrderedDict()
+
+
+def scenario(name):
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+def load_scenarios():
+    for module in MODULES:
+        importlib.import_module(module)
+    return SCENARIOS
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = int(round(q / 100.0 * (len(ordered) - 1)))
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(samples):
+    return OrderedDict([
+        ('n', len(samples)),
+        ('mean_ms', 1000 * sum(samples) / len(samples)),
+        ('p50_ms', 1000 * percentile(samples, 50)),
+        ('p95_ms', 1000 * percentile(samples, 95)),
+        ('p99_ms', 1000 * percentile(samples, 99)),
+    ])
+
+
+def create_user(prefix='bench'):
+    name = '%s_%s' % (prefix, uuid.uuid4().hex[:12])
+    user = User.objects.create(username=name, first_name=prefix, last_name=name)
+    user.info = CustomUserData.objects.create(user=user)
+    return user
+
+
+def api_call(view, user, path='/', method='get', data=None, **kwargs):
+    """Calls a DRF view function as ``user`` and renders the response."""
+    factory = APIRequestFactory()
+    request = getattr(factory, method)(path, data)
+    force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    response.render()
+    return response
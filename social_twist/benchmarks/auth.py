@@ -0,0 +1,45 @@
+import base64
+import datetime
+
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import get_access_token_model
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from social_twist.authentication import CachedOAuth2Authentication, tokens
+from social_twist.benchmarks import scenario, measure, create_user
+
+
+@scenario('auth')
+def auth(report, scale=None, repeat=200):
+    """
+    Authenticates a request with a bearer token the way the API used to, with the
+    cached backend (cold and warm), and with HTTP basic auth for reference.
+    """
+    user = create_user()
+    user.set_password('benchmark password')
+    user.save()
+    token = get_access_token_model().objects.create(
+        user=user, token='benchmark-token', scope='read write',
+        expires=timezone.now() + datetime.timedelta(hours=1))
+    factory = APIRequestFactory()
+
+    def authenticate(backend, header):
+        request = Request(factory.get('/', HTTP_AUTHORIZATION=header))
+        authenticated = backend.authenticate(request)
+        assert authenticated is not None and authenticated[0].pk == user.pk
+        # Every view reads the profile, with the uncached backends that's another query.
+        return authenticated[0].info
+
+    def cold():
+        tokens.forget(token.token)
+        authenticate(CachedOAuth2Authentication(), 'Bearer ' + token.token)
+
+    bearer = 'Bearer ' + token.token
+    basic = 'Basic ' + base64.b64encode(b'%s:benchmark password' % user.username.encode()).decode()
+    report('oauth2', measure(lambda: authenticate(OAuth2Authentication(), bearer), repeat))
+    report('cached oauth2, cold', measure(cold, repeat))
+    report('cached oauth2, warm', measure(lambda: authenticate(CachedOAuth2Authentication(), bearer), repeat))
+    report('basic', measure(lambda: authenticate(BasicAuthentication(), basic), min(repeat, 20)))
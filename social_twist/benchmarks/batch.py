@@ -0,0 +1,58 @@
+import itertools
+import random
+
+from django.contrib.gis.geos import Point
+from django.core.wsgi import get_wsgi_application
+from django.utils import timezone
+
+from social_twist.benchmarks import scenario, measure, create_user
+from social_twist.benchmarks.loadtest import issue_tokens, revoke_tokens, wsgi_request
+from social_twist.models import Event
+
+
+@scenario('batch')
+def batch(report, scale=None, repeat=20):
+    """
+    Replays a queue of likes, dislikes, attends and unattends, first as separate
+    requests, then as a single /batch/ request, for queues of up to ``scale``
+    operations (a hundred by default). Requests go through the whole WSGI stack,
+    bearer token authentication included.
+    """
+    scale = scale or 100
+    user = create_user('batch')
+    creator = create_user('batch_creator')
+    now = timezone.now()
+    events = Event.objects.bulk_create(
+        Event(title="batch event", description="", creator=creator, start_time=now,
+              coordinates=Point(random.uniform(-180, 180), random.uniform(-85, 85), srid=4326))
+        for _ in range(scale))
+    event_ids = [event.id for event in events]
+    application = get_wsgi_application()
+    tokens = issue_tokens([user.id])
+    token = tokens[user.id]
+    rounds = itertools.count()
+
+    def queue(size):
+        # Every round undoes the previous one, so that every operation writes.
+        ops = ('like', 'attend') if next(rounds) % 2 == 0 else ('dislike', 'unattend')
+        return [{'op': ops[i % 2], 'id': event_ids[i // 2]} for i in range(size)]
+
+    def sequential(size):
+        for operation in queue(size):
+            if operation['op'] == 'unattend':
+                method, path = 'DELETE', '/profile/%d/remove_attend/' % operation['id']
+            else:
+                method, path = 'POST', '/events/%d/%s/' % (operation['id'], operation['op'])
+            status = wsgi_request(application, method, path, token)
+            assert status < 400, (path, status)
+
+    def batched(size):
+        status = wsgi_request(application, 'POST', '/batch/', token, {'operations': queue(size)})
+        assert status == 200, status
+
+    try:
+        for size in sorted({min(10, scale), scale}):
+            report('%d operations, sequential' % size, measure(lambda: sequential(size), repeat))
+            report('%d operations, batched' % size, measure(lambda: batched(size), repeat))
+    finally:
+        revoke_tokens(tokens)
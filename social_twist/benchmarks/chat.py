@@ -0,0 +1,31 @@
+from social_twist.benchmarks import scenario, measure, create_user, api_call
+from social_twist.models import ChatMessage
+from social_twist.views.chat import MessageView
+
+
+@scenario('chat_history')
+def chat_history(report, scale=None, repeat=50):
+    """
+    Pages through a single thread of ``scale`` messages (a million by default)
+    at several depths. With keyset pagination every depth should cost the same.
+    """
+    scale = scale or 1000000
+    alice, bob = create_user('alice'), create_user('bob')
+    batch_size = 10000
+    for start in range(0, scale, batch_size):
+        ChatMessage.objects.bulk_create(
+            ChatMessage(sender=alice if i % 2 else bob,
+                        receiver=bob if i % 2 else alice,
+                        text="message %d" % i)
+            for i in range(start, min(start + batch_size, scale))
+        )
+    first_id = ChatMessage.objects.between(alice.id, bob.id).order_by('id')\
+        .values_list('id', flat=True).first()
+    view = MessageView.as_view({'get': 'retrieve'})
+
+    report('first page', measure(lambda: api_call(view, alice, pk=bob.id), repeat))
+    for depth in (10, 50, 90):
+        before_id = first_id + scale * (100 - depth) // 100
+        path = '/messages/%d/?before_id=%d' % (bob.id, before_id)
+        report('page %d%% deep' % depth,
+               measure(lambda: api_call(view, alice, path=path, pk=bob.id), repeat))
@@ -0,0 +1,40 @@
+from django.db import connection
+from django.db.backends.postgresql.base import Database
+
+from social_twist.benchmarks import scenario, measure, create_user
+from social_twist.db.pool import ConnectionPool, is_usable
+
+
+@scenario('connections')
+def connections(report, scale=None, repeat=100):
+    """
+    What a request pays for its connection: opening a new one, as with
+    CONN_MAX_AGE = 0, taking one from the pool, with and without the health
+    check, next to the cost of the health check and of a typical indexed query.
+    """
+    user = create_user()
+    params = connection.get_connection_params()
+
+    def connect():
+        Database.connect(**params).close()
+
+    pool = ConnectionPool(1, health_checks=False)
+    checked_pool = ConnectionPool(1, health_checks=True)
+
+    def take(pool):
+        pool.release(pool.acquire(lambda: Database.connect(**params)))
+
+    def query():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "username" FROM "auth_user" WHERE "id" = %s', [user.id])
+            cursor.fetchone()
+
+    try:
+        report('new connection', measure(connect, repeat))
+        report('pooled connection', measure(lambda: take(pool), repeat))
+        report('pooled connection, health checked', measure(lambda: take(checked_pool), repeat))
+        report('health check', measure(lambda: is_usable(connection.connection), repeat))
+        report('indexed query', measure(query, repeat))
+    finally:
+        pool.close()
+        checked_pool.close()
@@ -0,0 +1,57 @@
+import random
+
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.utils import timezone
+
+from social_twist.benchmarks import scenario, measure, create_user, api_call
+from social_twist.models import Event, FeedItem, Friendship
+from social_twist.views.events import EventView
+
+
+def seed_friends_with_events(reader, friend_count, events_per_friend, batch_size=10000):
+    """Gives ``reader`` new friends, each with their events fanned out into the feed."""
+    friends = [create_user('feed_friend') for _ in range(friend_count)]
+    Friendship.objects.bulk_create(
+        Friendship(user_id=a, friend_id=b)
+        for friend in friends
+        for a, b in ((reader.id, friend.id), (friend.id, reader.id))
+    )
+    now = timezone.now()
+    events = (Event(title="feed event", description="", creator=random.choice(friends), start_time=now,
+                    coordinates=Point(random.uniform(-180, 180), random.uniform(-85, 85), srid=4326))
+              for _ in range(friend_count * events_per_friend))
+    Event.objects.bulk_create(events, batch_size=batch_size)
+    # bulk_create sends no signals, so the events get fanned out in one go.
+    FeedItem.objects.execute_insert(
+        'SELECT f."friend_id", e."id" FROM "{event}" e '
+        'JOIN "{friendship}" f ON f."user_id" = e."creator_id" '
+        'WHERE e."creator_id" = ANY(%s)', [[friend.id for friend in friends]])
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE "social_twist_event"')
+        cursor.execute('ANALYZE "social_twist_feeditem"')
+
+
+@scenario('friends_feed')
+def friends_feed(report, scale=None, repeat=50):
+    """
+    Reads the first and a deep page of the friends' event feed while the reader's
+    friend count and event history grow tenfold at every step, up to ``scale``
+    friends (a thousand by default) with 100 events each.
+    """
+    scale = scale or 1000
+    reader = create_user('reader')
+    view = EventView.as_view({'get': 'by_friends'})
+    friend_count = 0
+    while friend_count < scale:
+        added = max(friend_count * 9, 10)
+        seed_friends_with_events(reader, min(added, scale - friend_count), 100)
+        friend_count += min(added, scale - friend_count)
+        ids = list(FeedItem.objects.filter(user=reader).order_by('event_id')
+                   .values_list('event_id', flat=True))
+        deep = ids[len(ids) // 10]
+        report('%d friends, first page' % friend_count,
+               measure(lambda: api_call(view, reader, path='/events/by_friends/'), repeat))
+        report('%d friends, deep page' % friend_count,
+               measure(lambda: api_call(view, reader, path='/events/by_friends/?before_id=%d' % deep),
+                       repeat))
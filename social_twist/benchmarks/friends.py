@@ -0,0 +1,91 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from social_twist.benchmarks import scenario, measure, api_call
+from social_twist.friends import graph
+from social_twist.models import CustomUserData, Friendship
+from social_twist.views.user import FriendView
+
+FRIENDS_OF_FRIENDS_SQL = '''
+    SELECT f2."friend_id", COUNT(*) AS "mutual"
+    FROM "social_twist_friendship" f1
+    JOIN "social_twist_friendship" f2 ON f2."user_id" = f1."friend_id"
+    WHERE f1."user_id" = %s AND f2."friend_id" <> %s
+      AND f2."friend_id" NOT IN (SELECT "friend_id" FROM "social_twist_friendship" WHERE "user_id" = %s)
+    GROUP BY f2."friend_id"
+    ORDER BY "mutual" DESC, f2."friend_id"
+    LIMIT 10
+'''
+
+
+def seed_graph(edges, average_degree=50, batch_size=10000):
+    """
+    Creates a friend graph of ``edges`` friendship rows (both directions count).
+    Low ids get picked far more often than high ones, so degrees follow a power law,
+    like in real social networks. Returns the ids of the users, most connected first.
+    """
+    count = max(edges // average_degree, 2)
+    user_ids = []
+    for start in range(0, count, batch_size):
+        users = User.objects.bulk_create(
+            User(username="bench_friend_%d_%d" % (start, i))
+            for i in range(min(batch_size, count - start))
+        )
+        CustomUserData.objects.bulk_create(CustomUserData(user=user) for user in users)
+        user_ids.extend(user.id for user in users)
+
+    def pick():
+        return user_ids[int(count * random.random() ** 3)]
+
+    pairs = set()
+    while len(pairs) * 2 < edges:
+        a, b = pick(), pick()
+        if a != b:
+            pairs.add((min(a, b), max(a, b)))
+    pairs = list(pairs)
+    for start in range(0, len(pairs), batch_size // 2):
+        Friendship.objects.bulk_create(
+            Friendship(user_id=user_id, friend_id=friend_id)
+            for a, b in pairs[start:start + batch_size // 2]
+            for user_id, friend_id in ((a, b), (b, a))
+        )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE "social_twist_friendship"')
+    return user_ids
+
+
+@scenario('friend_graph')
+def friend_graph(report, scale=None, repeat=50):
+    """
+    Seeds a power-law friend graph of ``scale`` friendship rows (a million by default)
+    and compares friend checks, mutual friend counts and suggestions from the adjacency
+    cache with the same answers computed in SQL.
+    """
+    scale = scale or 1000000
+    user_ids = seed_graph(scale)
+    hub, typical = user_ids[0], user_ids[len(user_ids) // 2]
+    view = FriendView.as_view({'get': 'suggestions'})
+
+    def sql_suggestions(user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(FRIENDS_OF_FRIENDS_SQL, [user_id, user_id, user_id])
+            cursor.fetchall()
+
+    def cold_suggestions(user_id):
+        graph.clear()
+        graph.suggestions(user_id)
+
+    graph.suggestions(hub)
+    report('friend check', measure(lambda: graph.are_friends(hub, random.choice(user_ids)), repeat))
+    report('friend check (SQL)', measure(lambda: Friendship.objects.filter(
+        user_id=hub, friend_id=random.choice(user_ids)).exists(), repeat))
+    report('mutual count', measure(lambda: graph.mutual_count(hub, typical), repeat))
+    for label, user_id in (('hub', hub), ('typical', typical)):
+        report('suggestions %s' % label, measure(lambda: graph.suggestions(user_id), repeat))
+        report('suggestions %s (cold)' % label, measure(lambda: cold_suggestions(user_id), repeat))
+        report('suggestions %s (SQL)' % label, measure(lambda: sql_suggestions(user_id), repeat))
+    user = User.objects.get(id=typical)
+    report('suggestions endpoint', measure(lambda: api_call(view, user, path='/friends/suggestions/'),
+                                           repeat))
@@ -0,0 +1,44 @@
+import random
+
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.utils import timezone
+
+from social_twist.benchmarks import scenario, measure, create_user, api_call
+from social_twist.models import Event
+from social_twist.views.events import EventView
+
+
+def seed_events(creator, count, batch_size=10000):
+    """Creates ``count`` public events spread uniformly over the globe."""
+    now = timezone.now()
+    for start in range(0, count, batch_size):
+        Event.objects.bulk_create(
+            Event(title="event %d" % i,
+                  description="description of event %d" % i,
+                  creator=creator,
+                  start_time=now,
+                  coordinates=Point(random.uniform(-180, 180), random.uniform(-85, 85), srid=4326))
+            for i in range(start, min(start + batch_size, count))
+        )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE "social_twist_event"')
+
+
+@scenario('geo_search')
+def geo_search(report, scale=None, repeat=50):
+    """
+    Seeds ``scale`` events (two million by default) and searches around random
+    points with growing radii, sorted by distance.
+    """
+    scale = scale or 2000000
+    user = create_user()
+    seed_events(user, scale)
+    view = EventView.as_view({'get': 'list'})
+
+    for radius in (1, 10, 100, 1000):
+        def search():
+            path = '/events/?lat=%f&lon=%f&radius=%d&sort=distance' % (
+                random.uniform(-180, 180), random.uniform(-85, 85), radius)
+            api_call(view, user, path=path)
+        report('radius %d km' % radius, measure(search, repeat))
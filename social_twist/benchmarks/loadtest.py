@@ -0,0 +1,248 @@
+"""
+Load tests driving the real URL routes through the WSGI application, see
+``./manage.py loadtest``.
+
+A run follows a plan: a list of requests drawn from a weighted mix of endpoints,
+as generated users of ``generate_social_graph``. Plans are generated from a seed
+and can be saved and replayed, so that two commits get the very same requests.
+"""
+import datetime
+import io
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from queue import Queue, Empty
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model
+
+from social_twist.benchmarks import summarize
+from social_twist.benchmarks.social_graph import USERNAME_PREFIX, CITIES, WORDS
+from social_twist.models import Event, Conversation
+
+AccessToken = get_access_token_model()
+
+
+def events_nearby(rng, context):
+    _, lon, lat = rng.choice(CITIES)
+    # The events view takes the x coordinate as lat and the y one as lon.
+    return 'GET', '/events/?lat=%f&lon=%f&radius=%d' % (lon, lat, rng.choice((5, 20, 50))), None
+
+
+def events_search(rng, context):
+    return 'GET', '/events/?text=%s' % rng.choice(WORDS), None
+
+
+def event_attenders(rng, context):
+    return 'GET', '/events/%d/attenders/' % rng.choice(context['events']), None
+
+
+def event_comments(rng, context):
+    return 'GET', '/events/%d/comments/' % rng.choice(context['events']), None
+
+
+def chat(rng, context, user_id):
+    companions = context['companions'].get(user_id)
+    if not companions:
+        return 'GET', '/messages/', None
+    return 'GET', '/messages/%d/' % rng.choice(companions), None
+
+
+def like(rng, context):
+    return 'POST', '/events/%d/like/' % rng.choice(context['events']), None
+
+
+def attend(rng, context):
+    return 'POST', '/events/%d/attend/' % rng.choice(context['events']), None
+
+
+def send_message(rng, context, user_id):
+    companions = context['companions'].get(user_id) or context['users']
+    return 'POST', '/messages/%d/send/' % rng.choice(companions), {'text': rng.choice(WORDS)}
+
+
+def fixed(path):
+    return lambda rng, context: ('GET', path, None)
+
+
+# name: (weight, request builder, whether it writes, whether it takes the user id)
+ENDPOINTS = OrderedDict([
+    ('events.list', (20, events_nearby, False, False)),
+    ('events.search', (10, events_search, False, False)),
+    ('events.by_friends', (10, fixed('/events/by_friends/'), False, False)),
+    ('events.attenders', (5, event_attenders, False, False)),
+    ('events.comments', (5, event_comments, False, False)),
+    ('messages.list', (10, fixed('/messages/'), False, False)),
+    ('messages.retrieve', (10, chat, False, True)),
+    ('friends.list', (5, fixed('/friends/'), False, False)),
+    ('friends.suggestions', (3, fixed('/friends/suggestions/'), False, False)),
+    ('profile.notifications_count', (10, fixed('/profile/notifications_count/'), False, False)),
+    ('invitations.list', (5, fixed('/invitations/'), False, False)),
+    ('users.search', (5, lambda rng, context: ('GET', '/users/search/?name=%s' % rng.choice(
+        context['names']), None), False, False)),
+    ('sync', (2, fixed('/sync/'), False, False)),
+    ('events.like', (5, like, True, False)),
+    ('events.attend', (2, attend, True, False)),
+    ('messages.send', (5, send_message, True, True)),
+])
+
+
+def load_context(users, rng):
+    """Ids the request builders pick from: a sample of generated users, their chats, and events."""
+    user_ids = list(User.objects.filter(username__startswith=USERNAME_PREFIX)
+                    .order_by('id').values_list('id', flat=True))
+    if not user_ids:
+        raise ValueError("There are no generated users, run generate_social_graph first.")
+    sample = rng.sample(user_ids, min(users, len(user_ids)))
+    companions = defaultdict(list)
+    for owner_id, companion_id in Conversation.objects.filter(owner_id__in=sample)\
+            .values_list('owner_id', 'companion_id'):
+        companions[owner_id].append(companion_id)
+    event_ids = list(Event.objects.order_by('-id').values_list('id', flat=True)[:10000])
+    names = list(User.objects.filter(id__in=rng.sample(sample, min(100, len(sample))))
+                 .values_list('first_name', flat=True))
+    return {'users': sample, 'companions': dict(companions), 'events': event_ids,
+            'names': [name[:3] for name in names]}
+
+
+def make_plan(requests, users=100, seed=0, writes=False, endpoints=None):
+    """Draws ``requests`` requests from the endpoint mix, as a JSON serializable list."""
+    rng = random.Random(seed)
+    context = load_context(users, rng)
+    mix = [(name, spec) for name, spec in ENDPOINTS.items()
+           if (writes or not spec[2]) and (not endpoints or name in endpoints)]
+    names = [name for name, _ in mix]
+    weights = [spec[0] for _, spec in mix]
+    specs = dict(mix)
+    plan = []
+    for name in rng.choices(names, weights, k=requests):
+        _, build, _, takes_user = specs[name]
+        user_id = rng.choice(context['users'])
+        method, path, data = build(rng, context, user_id) if takes_user else build(rng, context)
+        plan.append({'endpoint': name, 'user_id': user_id, 'method': method, 'path': path, 'data': data})
+    return plan
+
+
+def issue_tokens(user_ids):
+    """Access tokens for the users of a plan, deleted again by ``revoke_tokens``."""
+    expires = timezone.now() + datetime.timedelta(hours=12)
+    tokens = {user_id: AccessToken(user_id=user_id, token='loadtest-' + secrets.token_urlsafe(24),
+                                   expires=expires, scope='read write')
+              for user_id in set(user_ids)}
+    AccessToken.objects.bulk_create(tokens.values())
+    return {user_id: token.token for user_id, token in tokens.items()}
+
+
+def revoke_tokens(tokens):
+    AccessToken.objects.filter(token__in=list(tokens.values())).delete()
+
+
+def wsgi_request(application, method, path, token, data=None):
+    """Calls the WSGI application like a server would, returns the status code."""
+    url = urlsplit(path)
+    body = json.dumps(data).encode() if data is not None else b''
+    host = settings.ALLOWED_HOSTS[0]
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_AUTHORIZATION': 'Bearer %s' % token,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    result = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split()[0])
+
+
+def run(plan, concurrency=1, warmup=0):
+    """
+    Replays the plan with ``concurrency`` threads. The first ``warmup`` requests are
+    made one by one beforehand, and not measured. Returns the results per endpoint and in total.
+    """
+    application = get_wsgi_application()
+    tokens = issue_tokens(entry['user_id'] for entry in plan)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    queue = Queue()
+    for entry in plan[warmup:]:
+        queue.put(entry)
+
+    def send(entry):
+        try:
+            return wsgi_request(application, entry['method'], entry['path'],
+                                tokens[entry['user_id']], entry['data'])
+        except Exception:
+            return 599
+
+    def worker():
+        try:
+            while True:
+                try:
+                    entry = queue.get_nowait()
+                except Empty:
+                    return
+                start = time.perf_counter()
+                status = send(entry)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    samples[entry['endpoint']].append(elapsed)
+                    if status >= 400:
+                        errors[entry['endpoint']] += 1
+        finally:
+            connections.close_all()
+
+    try:
+        for entry in plan[:warmup]:
+            send(entry)
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+    finally:
+        revoke_tokens(tokens)
+
+    endpoints = OrderedDict()
+    for name in sorted(samples):
+        result = summarize(samples[name])
+        result['errors'] = errors[name]
+        result['throughput_rps'] = len(samples[name]) / wall
+        endpoints[name] = result
+    measured = sum(len(values) for values in samples.values())
+    total = summarize([value for values in samples.values() for value in values]) if measured else {}
+    total['errors'] = sum(errors.values())
+    total['throughput_rps'] = measured / wall
+    total['wall_s'] = wall
+    return OrderedDict([('total', total), ('endpoints', endpoints)])
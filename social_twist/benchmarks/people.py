@@ -0,0 +1,47 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from social_twist.benchmarks import scenario, measure, create_user, api_call
+from social_twist.models import CustomUserData
+from social_twist.views.user import UserView
+
+SYLLABLES = "an bel cor dan el fi gor ha is jo ka li mar no ol pe qui ra sa tor ul vi wen xa yo zu".split()
+
+
+def random_name():
+    return "".join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4))).capitalize()
+
+
+def seed_people(count, batch_size=10000):
+    """Creates ``count`` users with profiles and random names."""
+    for start in range(0, count, batch_size):
+        users = User.objects.bulk_create(
+            User(username="bench_person_%d_%d" % (start, i),
+                 first_name=random_name(),
+                 last_name=random_name())
+            for i in range(min(batch_size, count - start))
+        )
+        CustomUserData.objects.bulk_create(CustomUserData(user=user) for user in users)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE "auth_user"')
+
+
+@scenario('user_search')
+def user_search(report, scale=None, repeat=50):
+    """
+    Seeds ``scale`` users (a million by default) and searches them by name prefix,
+    by a whole name and by a misspelled name.
+    """
+    scale = scale or 1000000
+    seed_people(scale)
+    user = create_user()
+    view = UserView.as_view({'get': 'search'})
+
+    def search(name):
+        api_call(view, user, path='/users/search/', data={'name': name})
+
+    report('prefix', measure(lambda: search(random.choice(SYLLABLES).capitalize()), repeat))
+    report('whole name', measure(lambda: search(random_name()), repeat))
+    report('misspelled name', measure(lambda: search(random_name()[:-1] + "x"), repeat))
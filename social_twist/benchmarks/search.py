@@ -0,0 +1,64 @@
+import random
+
+from django.contrib.gis.geos import Point
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from social_twist.benchmarks import scenario, measure, create_user
+from social_twist.models import Event, event_search_vector
+
+WORDS = ("party concert football jazz picnic lecture hackathon yoga sunset beach "
+         "museum theatre cinema market festival marathon chess poetry karaoke "
+         "brunch meetup tasting workshop climbing kayak gallery opera salsa").split()
+
+
+def random_text(words):
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+
+@scenario('event_text_search')
+def event_text_search(report, scale=None, repeat=50):
+    """
+    Seeds ``scale`` events (500k by default) with long descriptions and compares
+    the former icontains search with the full text one, both on the first page.
+    """
+    scale = scale or 500000
+    user = create_user()
+    now = timezone.now()
+    batch_size = 5000
+    for start in range(0, scale, batch_size):
+        Event.objects.bulk_create(
+            Event(title=random_text(3),
+                  description=random_text(300),
+                  location=random_text(2),
+                  creator=user,
+                  start_time=now,
+                  coordinates=Point(random.uniform(-180, 180), random.uniform(-85, 85), srid=4326))
+            for _ in range(start, min(start + batch_size, scale))
+        )
+    Event.objects.filter(creator=user).update(search_vector=event_search_vector(user))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE "social_twist_event"')
+
+    def icontains():
+        text = random.choice(WORDS)
+        list(Event.objects.filter(Q(title__icontains=text) |
+                                  Q(description__icontains=text) |
+                                  Q(location__icontains=text) |
+                                  Q(creator__first_name__icontains=text) |
+                                  Q(creator__last_name__icontains=text))[:10])
+
+    def full_text(typo=False):
+        text = random.choice(WORDS)
+        if typo:
+            text = text[:-1]
+        query = SearchQuery(text)
+        list(Event.objects.filter(Q(search_vector=query) | Q(title__trigram_similar=text))
+             .annotate(rank=SearchRank('search_vector', query) + TrigramSimilarity('title', text))
+             .order_by('-rank', '-start_time')[:10])
+
+    report('icontains', measure(icontains, repeat))
+    report('full text', measure(full_text, repeat))
+    report('full text with typo', measure(lambda: full_text(typo=True), repeat))
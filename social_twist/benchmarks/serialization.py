@@ -0,0 +1,44 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+from social_twist.benchmarks import scenario, measure, create_user
+from social_twist.benchmarks.geo import seed_events
+from social_twist.models import Event, Friendship
+from social_twist.renderers import FastJSONRenderer
+from social_twist.serializers import EventSerializer, FriendSerializer
+
+
+def compare(report, label, serializer_class, objects, repeat):
+    """Times DRF's list serialization and rendering against the fast path, which must match it."""
+    def drf():
+        return JSONRenderer().render(ListSerializer(objects, child=serializer_class()).data)
+
+    def fast():
+        return FastJSONRenderer().render(serializer_class(objects, many=True).data)
+
+    if drf() != fast():
+        raise AssertionError("The fast path renders %s differently." % label)
+    report('%s DRF' % label, measure(drf, repeat))
+    report('%s fast' % label, measure(fast, repeat))
+    report('%s fast, DRF renderer' % label,
+           measure(lambda: JSONRenderer().render(serializer_class(objects, many=True).data), repeat))
+
+
+@scenario('serialization')
+def serialization(report, scale=None, repeat=10):
+    """
+    Serializes and renders ``scale`` events and friends (10k by default), loaded up
+    front, with DRF's ListSerializer and JSONRenderer and with the fast path.
+    """
+    scale = scale or 10000
+    user = create_user()
+    friends = [create_user('friend') for _ in range(10)]
+    for friend in friends:
+        Friendship.objects.befriend(user, friend)
+    seed_events(user, scale)
+    events = list(EventSerializer.setup_eager_loading(Event.objects.filter(creator=user)))
+    compare(report, 'events', EventSerializer, events, repeat)
+
+    people = list(FriendSerializer.setup_eager_loading(user.info.friends.all()))
+    people = (people * (scale // len(people) + 1))[:scale]
+    compare(report, 'friends', FriendSerializer, people, repeat)
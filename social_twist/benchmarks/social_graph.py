@@ -0,0 +1,230 @@
+"""
+Synthetic, but realistically shaped, data for load tests, see
+``./manage.py generate_social_graph``.
+
+Everything is written with bulk inserts, which send no signals, so the
+denormalized tables (search vectors, feeds, conversations, reaction and
+notification counters) are rebuilt in bulk afterwards.
+"""
+import datetime
+import itertools
+import random
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from social_twist.benchmarks.people import random_name
+from social_twist.caching import get_cache
+from social_twist.models import CustomUserData, Friendship, Event, FeedItem, ChatMessage, \
+    EventReaction, Comment, Invitation
+
+USERNAME_PREFIX = 'gen_'
+
+# (name, longitude, latitude) of the places events cluster around.
+CITIES = (
+    ("Berlin", 13.40, 52.52), ("London", -0.13, 51.51), ("New York", -74.01, 40.71),
+    ("San Francisco", -122.42, 37.77), ("Tokyo", 139.69, 35.69), ("Sao Paulo", -46.63, -23.55),
+    ("Sydney", 151.21, -33.87), ("Lagos", 3.38, 6.52), ("Mumbai", 72.88, 19.08),
+    ("Kyiv", 30.52, 50.45),
+)
+CATEGORIES = ("party", "sport", "music", "art", "food", "travel", "study", "games")
+WORDS = ("open air concert picnic football match exhibition tasting hike workshop meetup "
+         "jam session quiz night marathon karaoke lecture cinema festival").split()
+
+SEARCH_VECTOR_SQL = '''
+    UPDATE "social_twist_event" e SET "search_vector" =
+        setweight(to_tsvector(e."title"), 'A') ||
+        setweight(to_tsvector(u."first_name" || ' ' || u."last_name"), 'B') ||
+        setweight(to_tsvector(e."location"), 'B') ||
+        setweight(to_tsvector(e."description"), 'C')
+    FROM "auth_user" u WHERE u."id" = e."creator_id" AND e."id" >= %s
+'''
+
+
+def skewed(ids, exponent=3):
+    """Picks an id, the first ones far more often, which gives power-law degrees."""
+    return ids[int(len(ids) * random.random() ** exponent)]
+
+
+def sentence(count):
+    return " ".join(random.choice(WORDS) for _ in range(count))
+
+
+class SocialGraphGenerator(object):
+    def __init__(self, users, friends=20, events=2, messages=20, reactions=10, comments=2,
+                 batch_size=10000, log=print):
+        self.users = users
+        self.friends = friends
+        self.events = events
+        self.messages = messages
+        self.reactions = reactions
+        self.comments = comments
+        self.batch_size = batch_size
+        self.log = log
+
+    def bulk(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def generate(self):
+        user_ids = self.create_users()
+        pairs = self.create_friendships(user_ids)
+        event_ids = self.create_events(user_ids)
+        self.create_attendance_and_invitations(event_ids, pairs)
+        self.create_messages(pairs)
+        self.create_reactions_and_comments(user_ids, event_ids)
+        self.rebuild_denormalized(event_ids)
+
+    def create_users(self):
+        run = timezone.now().strftime('%Y%m%d%H%M%S')
+        user_ids = []
+        for start in range(0, self.users, self.batch_size):
+            users = User.objects.bulk_create(
+                User(username='%s%s_%d' % (USERNAME_PREFIX, run, i),
+                     first_name=random_name(),
+                     last_name=random_name())
+                for i in range(start, min(start + self.batch_size, self.users))
+            )
+            CustomUserData.objects.bulk_create(
+                CustomUserData(user=user,
+                               location=random.choice(CITIES)[0],
+                               sex=random.choice("fm"),
+                               birthday=datetime.date(random.randint(1960, 2005), 1, 1) +
+                               datetime.timedelta(days=random.randint(0, 364)))
+                for user in users
+            )
+            user_ids.extend(user.id for user in users)
+        self.log("%d users" % len(user_ids))
+        return user_ids
+
+    def create_friendships(self, user_ids):
+        """One end of every friendship is picked uniformly, the other one skewed."""
+        possible = len(user_ids) * (len(user_ids) - 1) // 2
+        wanted = min(len(user_ids) * self.friends // 2, possible)
+        pairs = set()
+        if wanted * 2 > possible:
+            # Dense enough that most random picks would be pairs taken already.
+            pairs.update(random.sample(list(itertools.combinations(sorted(user_ids), 2)), wanted))
+        while len(pairs) < wanted:
+            a, b = random.choice(user_ids), skewed(user_ids)
+            if a != b:
+                pairs.add((min(a, b), max(a, b)))
+        pairs = list(pairs)
+        info_ids = dict(CustomUserData.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+        through = CustomUserData.friends.through
+        for start in range(0, len(pairs), self.batch_size):
+            chunk = pairs[start:start + self.batch_size]
+            Friendship.objects.bulk_create(Friendship(user_id=user_id, friend_id=friend_id)
+                                           for a, b in chunk
+                                           for user_id, friend_id in ((a, b), (b, a)))
+            through.objects.bulk_create(through(customuserdata_id=info_ids[user_id], user_id=friend_id)
+                                        for a, b in chunk
+                                        for user_id, friend_id in ((a, b), (b, a)))
+        self.log("%d friendships" % len(pairs))
+        return pairs
+
+    def create_events(self, user_ids):
+        now = timezone.now()
+        first_id = None
+        limit = settings.FEED_FANOUT_MAX_FRIENDS
+        celebrities = set(Friendship.objects.filter(user_id__in=user_ids).values('user_id')
+                          .annotate(friends=Count('id')).filter(friends__gt=limit)
+                          .values_list('user_id', flat=True))
+        count = self.users * self.events
+        for start in range(0, count, self.batch_size):
+            events = []
+            for _ in range(min(self.batch_size, count - start)):
+                city, lon, lat = random.choice(CITIES)
+                creator_id = skewed(user_ids, 2)
+                events.append(Event(
+                    title=sentence(random.randint(1, 3)).capitalize(),
+                    description=sentence(random.randint(5, 30)),
+                    creator_id=creator_id,
+                    start_time=now + datetime.timedelta(minutes=random.randint(-60 * 24 * 60, 60 * 24 * 60)),
+                    coordinates=Point(random.gauss(lon, 0.1), random.gauss(lat, 0.1), srid=4326),
+                    location=city,
+                    type=random.choice(CATEGORIES),
+                    is_private=random.random() < 0.1,
+                    fanned_out=creator_id not in celebrities,
+                ))
+            events = Event.objects.bulk_create(events)
+            if first_id is None and events:
+                first_id = events[0].id
+        event_ids = list(Event.objects.filter(id__gte=first_id or 0).values_list('id', flat=True))
+        self.log("%d events" % len(event_ids))
+        return event_ids
+
+    def create_attendance_and_invitations(self, event_ids, pairs):
+        friends = {}
+        for a, b in pairs:
+            friends.setdefault(a, []).append(b)
+            friends.setdefault(b, []).append(a)
+        creators = dict(Event.objects.filter(id__gte=min(event_ids, default=0)).values_list('id', 'creator_id'))
+        through = Event.attenders.through
+        attendance, invitations = [], []
+        for event_id in event_ids:
+            creator_id = creators[event_id]
+            circle = friends.get(creator_id, [])
+            guests = set(random.sample(circle, min(len(circle), int(random.expovariate(1 / 5.0)))))
+            attendance.extend(through(event_id=event_id, user_id=user_id) for user_id in guests | {creator_id})
+            invitations.extend(Invitation(sender_id=creator_id, receiver_id=user_id, event_id=event_id)
+                               for user_id in random.sample(circle, min(len(circle), random.randint(0, 3)))
+                               if user_id not in guests)
+        self.bulk(through, attendance)
+        self.bulk(Invitation, invitations)
+        self.log("%d attendances, %d invitations" % (len(attendance), len(invitations)))
+
+    def create_messages(self, pairs):
+        """Chats between friends, most of them short, a few very long."""
+        count = self.users * self.messages
+        created = 0
+        messages = []
+        while created < count and pairs:
+            a, b = random.choice(pairs)
+            length = min(int(random.paretovariate(1.2) * 5), count - created)
+            for i in range(length):
+                sender, receiver = (a, b) if random.random() < 0.5 else (b, a)
+                messages.append(ChatMessage(sender_id=sender, receiver_id=receiver,
+                                            text=sentence(random.randint(1, 12)),
+                                            seen=i < length - 2))
+            created += length
+            if len(messages) >= self.batch_size:
+                self.bulk(ChatMessage, messages)
+                messages = []
+        self.bulk(ChatMessage, messages)
+        self.log("%d messages" % created)
+
+    def create_reactions_and_comments(self, user_ids, event_ids):
+        reactions = set()
+        for _ in range(len(user_ids) * self.reactions):
+            reactions.add((random.choice(user_ids), skewed(event_ids, 2)))
+        self.bulk(EventReaction, (EventReaction(person_id=person_id, event_id=event_id,
+                                                liked=liked, disliked=not liked)
+                                  for (person_id, event_id), liked in
+                                  ((reaction, random.random() < 0.8) for reaction in reactions)))
+        comments = [Comment(author_id=random.choice(user_ids), event_id=skewed(event_ids, 2),
+                            text=sentence(random.randint(2, 20)))
+                    for _ in range(len(user_ids) * self.comments)]
+        self.bulk(Comment, comments)
+        self.log("%d reactions, %d comments" % (len(reactions), len(comments)))
+
+    def rebuild_denormalized(self, event_ids):
+        if event_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(SEARCH_VECTOR_SQL, [min(event_ids)])
+            FeedItem.objects.execute_insert(
+                'SELECT f."friend_id", e."id" FROM "{event}" e '
+                'JOIN "{friendship}" f ON f."user_id" = e."creator_id" '
+                'WHERE e."id" >= %s AND e."fanned_out"', [min(event_ids)])
+        call_command('backfill_conversations')
+        call_command('reconcile_reactions')
+        call_command('check_notification_counters', fix=True, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        # Nothing above sent signals, drop whatever was cached before.
+        get_cache().clear()
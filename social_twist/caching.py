@@ -0,0 +1,160 @@
+"""
+Caching of read-only responses.
+
+A cached response depends on resources, like ``event:42`` or ``person:7``.
+Every resource has a version number stored in the cache, which the model
+signals in ``social_twist.models`` bump once the transaction changing the
+resource commits. The versions of the resources known up front are part of the
+response keys, so a bump makes every response built from them unreachable,
+without having to know their keys. The resources only known once the response
+is built, e.g. the events of a list, are stored along with it, with their
+versions, and checked on every hit.
+
+Versions are the time of the last bump, in microseconds. A response depending
+on a resource bumped since it started being built, give or take
+``settings.RESPONSE_CACHE_CLOCK_SKEW`` seconds, may have read it before the
+change, so it isn't cached.
+
+Cached responses carry an ETag, which clients can send back in If-None-Match
+to get a 304 instead of the whole body.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from social_twist.renderers import FastJSONRenderer
+from social_twist.replicas import primary
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def version_key(resource):
+    return 'version:%s' % resource
+
+
+def new_version():
+    # A timestamp, so that an evicted version never gets reused.
+    return int(time.time() * 1000000)
+
+
+def bump(*resources):
+    """Invalidates every cached response depending on any of the resources."""
+    if resources:
+        version = new_version()
+        get_cache().set_many({version_key(resource): version for resource in resources}, None)
+
+
+def bump_on_commit(*resources):
+    """
+    ``bump`` once the current transaction commits, so that nobody can cache what
+    was read before under the new versions.
+    """
+    transaction.on_commit(lambda: bump(*resources))
+
+
+def people_in(people):
+    """Resources of serialized people, along with the friends listed with them."""
+    for person in people:
+        yield 'person:%d' % person['id']
+        if 'friends' in person:
+            yield 'user:%d' % person['id']
+            for friend in person['friends']:
+                yield 'person:%d' % friend['id']
+
+
+def events_in(events):
+    """Resources of serialized events, along with their creators."""
+    for event in events:
+        yield 'event:%d' % event['id']
+        if event.get('creator'):
+            yield from people_in([event['creator']])
+
+
+def comments_in(comments):
+    """Resources of the authors of serialized comments, the comments belong to their event."""
+    return people_in(comment['author'] for comment in comments)
+
+
+def get_versions(resources, seed=None):
+    """
+    Versions of the resources. The ones never bumped, or evicted, start at
+    ``seed``, by default a bit before now, so that responses built since then
+    can be cached on them.
+    """
+    cache = get_cache()
+    keys = [version_key(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        if seed is None:
+            seed = new_version() - 2 * settings.RESPONSE_CACHE_CLOCK_SKEW * 1000000
+        cache.set_many({key: seed for key in missing}, None)
+        # Whatever a concurrent bump or seed left wins.
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, seed) for key in keys]
+
+
+def etag_matches(etag, request):
+    """Whether the If-None-Match header of the request matches the ETag, weakly."""
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in etags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+
+def cached_response(*resources, depends=None):
+    """
+    Caches the successful GET responses of a viewset action, per user and URL.
+    ``resources`` are the resources the response depends on, formatted with the
+    ``pk`` of the request and the id of the current user as ``me``,
+    e.g. ``'event:{pk}'`` or ``'user:{me}'``. ``depends`` returns the resources
+    the response data depends on, e.g. ``events_in``, given the data itself, or
+    its ``results`` when it's a page.
+    """
+    def decorator(action):
+        @wraps(action)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return action(view, request, *args, **kwargs)
+            started = new_version()
+            # Older than the response, so that it gets cached on resources never bumped.
+            horizon = started - settings.RESPONSE_CACHE_CLOCK_SKEW * 1000000
+            tags = [resource.format(pk=kwargs.get('pk'), me=request.user.id) for resource in resources]
+            fingerprint = '%s|%s|%s' % (request.user.id, request.get_full_path(), get_versions(tags, horizon - 1))
+            key = 'response:%s' % hashlib.sha1(fingerprint.encode()).hexdigest()
+            cache = get_cache()
+
+            entry = cache.get(key)
+            if entry is not None and entry[2] and get_versions(entry[2], horizon - 1) != entry[3]:
+                entry = None
+            if entry is None:
+                with primary():
+                    response = action(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                dependencies = []
+                if depends is not None:
+                    items = data['results'] if isinstance(data, dict) and 'results' in data else data
+                    dependencies = sorted(set(depends(items)))
+                versions = get_versions(dependencies, horizon - 1)
+                etag = '"%s"' % hashlib.sha1(FastJSONRenderer().render(data)).hexdigest()
+                if max(versions, default=0) < horizon:
+                    cache.set(key, (etag, data, dependencies, versions), settings.RESPONSE_CACHE_TIMEOUT)
+            else:
+                etag, data = entry[:2]
+                response = Response(data)
+
+            if etag_matches(etag, request):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
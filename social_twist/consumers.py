@@ -0,0 +1,69 @@
+from urllib.parse import parse_qs
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import SimpleLazyObject
+
+from social_twist.authentication import authenticate_token
+from social_twist.realtime import user_group
+
+
+class OAuth2TokenAuthMiddleware(object):
+    """
+    Authenticates websocket connections with the same OAuth2 access tokens
+    the REST API uses, once the consumer first reads ``scope['user']``. The token is taken either from the ``access_token``
+    query param (browsers can't set headers on websockets) or from the
+    ``Authorization: Bearer`` header.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __call__(self, scope):
+        # Channels calls this on the event loop thread, which must not wait on
+        # the database. The user is looked up when first used instead, in the
+        # thread of the consumer.
+        token = self.get_token(scope)
+        return self.inner(dict(scope, user=SimpleLazyObject(lambda: self.get_user(token))))
+
+    @staticmethod
+    def get_user(token):
+        authenticated = authenticate_token(token) if token else None
+        return authenticated[0] if authenticated is not None else AnonymousUser()
+
+    @staticmethod
+    def get_token(scope):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if query.get('access_token'):
+            return query['access_token'][0]
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                kind, _, token = value.decode().partition(' ')
+                if kind.lower() == 'bearer':
+                    return token.strip()
+        return None
+
+
+class NotificationConsumer(JsonWebsocketConsumer):
+    """
+    Delivers events pushed through ``social_twist.realtime.push`` to the user.
+    Every frame looks like ``{"event": "chat.message", "payload": {...}}``.
+    """
+    group = None
+
+    def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            self.close()
+            return
+        self.group = user_group(user.id)
+        async_to_sync(self.channel_layer.group_add)(self.group, self.channel_name)
+        self.accept()
+
+    def disconnect(self, code):
+        if self.group is not None:
+            async_to_sync(self.channel_layer.group_discard)(self.group, self.channel_name)
+
+    def push(self, message):
+        self.send_json({'event': message['event'], 'payload': message['payload']})
@@ -0,0 +1,60 @@
+"""
+The PostGIS backend, with health checks of persistent connections and an optional
+in-process connection pool, see ``social_twist.db.pool``.
+
+On top of Django's settings, a database takes:
+
+* ``HEALTH_CHECKS``: whether a persistent connection is checked with ``SELECT 1``
+  before its first use in a request, and replaced if it doesn't answer.
+  Otherwise a connection dropped by the server breaks the next request it serves.
+* ``POOL``: ``SIZE``, the most connections the threads of a process share,
+  ``IDLE_TIMEOUT`` in seconds, and ``TIMEOUT``, how long to wait for a free
+  connection. Without a size there's no pool. With one, connections go back to
+  the pool at the end of every request, so ``CONN_MAX_AGE`` should be 0.
+"""
+from django.contrib.gis.db.backends.postgis.base import DatabaseWrapper as PostGISDatabaseWrapper
+
+from social_twist.db.pool import get_pool
+
+
+class DatabaseWrapper(PostGISDatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = get_pool(self.alias, self.settings_dict)
+        self.health_check_pending = False
+        self.pool_key = None
+
+    def get_new_connection(self, conn_params):
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        # The test runner closes the connection, then points NAME at the test
+        # database: an idle connection must match what it's asked for now.
+        self.pool_key = tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                                       self.pool_key)
+        # A new connection has it set already, a pooled one got it the same way.
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using the connection until the block exits, it can't be shared.
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection, self.pool_key)
+
+    def close_if_unusable_or_obsolete(self):
+        # Django calls this at the start and the end of every request.
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None and self.pool is None and self.settings_dict.get('HEALTH_CHECKS'):
+            self.health_check_pending = True
+
+    def ensure_connection(self):
+        if self.health_check_pending and not self.in_atomic_block:
+            self.health_check_pending = False
+            if self.connection is not None and not self.is_usable():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,165 @@
+"""
+In-process pool of database connections, for the ``social_twist.db.backends.postgis``
+backend.
+
+Django ties a connection to a thread, and with ``CONN_MAX_AGE`` keeps it for the
+thread's life. Under threaded uWSGI or an ASGI server that's a connection per
+thread, most of them idle. With a pool, a request takes a connection when it
+first queries and gives it back when it's done, so the threads of a process
+share at most ``size`` connections.
+
+Connections idle for longer than ``idle_timeout`` seconds get closed. An idle
+connection is only handed out again for the same connection parameters, e.g.
+not once the test runner has switched the database to the test one. With
+health checks, a connection is checked with ``SELECT 1`` before it's handed
+out again, and replaced if it doesn't answer.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Error:
+        pass
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Error:
+        return False
+    return True
+
+
+class ConnectionPool(object):
+    def __init__(self, size, idle_timeout=300, timeout=10, health_checks=True):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.health_checks = health_checks
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.idle = deque()  # (connection, idle since, params key), the most recently used last
+        self.in_use = 0
+        self.pid = os.getpid()
+
+    def acquire(self, connect, key=None):
+        """
+        Hands out an idle connection made with the same ``key``, the connection
+        parameters, or a new one made by ``connect()``. Waits for one to come back
+        while ``size`` of them are in use, at most ``timeout`` seconds.
+        """
+        deadline = time.monotonic() + self.timeout
+        stale = []
+        with self.lock:
+            self.check_fork()
+            while True:
+                self.prune()
+                connection = None
+                while self.idle and connection is None:
+                    connection, _, idle_key = self.idle.pop()
+                    if idle_key != key:
+                        # Connected elsewhere, the parameters have changed since.
+                        stale.append(connection)
+                        connection = None
+                if connection is not None:
+                    break
+                if self.in_use < self.size:
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OperationalError("All %d pooled connections are in use." % self.size)
+                self.available.wait(remaining)
+            self.in_use += 1
+
+        for stale_connection in stale:
+            close_quietly(stale_connection)
+        if connection is not None and self.health_checks and not is_usable(connection):
+            close_quietly(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = connect()
+            except Exception:
+                self.discard(None)
+                raise
+        return connection
+
+    def release(self, connection, key=None):
+        """
+        Takes a connection back, rolled back, unless it's broken or the pool is full.
+        ``key`` is the one it was acquired with.
+        """
+        if not connection.closed and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+        healthy = not connection.closed and connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        with self.lock:
+            if os.getpid() == self.pid:
+                self.in_use -= 1
+                if healthy and len(self.idle) < self.size:
+                    self.idle.append((connection, time.monotonic(), key))
+                    connection = None
+                self.available.notify()
+        if connection is not None:
+            close_quietly(connection)
+
+    def discard(self, connection):
+        """Closes a connection that was handed out, instead of taking it back."""
+        with self.lock:
+            if os.getpid() == self.pid:
+                self.in_use -= 1
+                self.available.notify()
+        if connection is not None:
+            close_quietly(connection)
+
+    def prune(self):
+        """Closes the connections idle for too long. The lock must be held."""
+        expired = time.monotonic() - self.idle_timeout
+        while self.idle and self.idle[0][1] < expired:
+            close_quietly(self.idle.popleft()[0])
+
+    def check_fork(self):
+        """
+        Forgets the connections of the parent process, without closing them, as
+        they belong to it. The lock must be held.
+        """
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.idle.clear()
+            self.in_use = 0
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for connection, _, _ in idle:
+            close_quietly(connection)
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """The pool of the database alias, None if its ``POOL['SIZE']`` isn't set."""
+    options = settings_dict.get('POOL') or {}
+    if not options.get('SIZE'):
+        return None
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(options['SIZE'],
+                                          idle_timeout=options.get('IDLE_TIMEOUT', 300),
+                                          timeout=options.get('TIMEOUT', 10),
+                                          health_checks=settings_dict.get('HEALTH_CHECKS', False))
+        return pools[alias]
@@ -0,0 +1,118 @@
+"""
+In-process cache of the friend graph.
+
+The friends of a user are kept as a sorted array of ids, loaded from the
+Friendship table on first use. That makes friend checks a binary search and
+mutual friend counts an intersection of two arrays, without touching the
+database. Every user's
+array is stamped with the version of the ``friends:<id>`` resource of
+``social_twist.caching``, which ``Friendship.objects.befriend`` and ``unfriend``
+bump, so that a change in one process makes every other process reload it.
+The least recently used arrays are evicted past ``settings.FRIEND_GRAPH_CACHE_SIZE``.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from social_twist.caching import get_versions
+from social_twist.models import Friendship
+from social_twist.replicas import primary
+
+EMPTY = array('i')
+
+
+class FriendGraph(object):
+    def __init__(self, max_users=None):
+        self.max_users = max_users or settings.FRIEND_GRAPH_CACHE_SIZE
+        self.entries = OrderedDict()  # user id -> (version, sorted array of friend ids)
+        self.lock = threading.Lock()
+
+    def friends_of(self, user_ids):
+        """Sorted arrays of friend ids of every one of the users, by user id."""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+        versions = dict(zip(user_ids, get_versions(['friends:%d' % user_id for user_id in user_ids])))
+        result = {}
+        with self.lock:
+            for user_id in user_ids:
+                entry = self.entries.get(user_id)
+                if entry is not None and entry[0] == versions[user_id]:
+                    self.entries.move_to_end(user_id)
+                    result[user_id] = entry[1]
+
+        stale = [user_id for user_id in user_ids if user_id not in result]
+        if stale:
+            with primary():
+                loaded = self.load(stale)
+            with self.lock:
+                for user_id in stale:
+                    result[user_id] = loaded.get(user_id, EMPTY)
+                    self.entries[user_id] = (versions[user_id], result[user_id])
+                    self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_users:
+                    self.entries.popitem(last=False)
+        return result
+
+    def friends(self, user_id):
+        return self.friends_of([user_id])[user_id]
+
+    @staticmethod
+    def load(user_ids):
+        edges = Friendship.objects.filter(user_id__in=user_ids)\
+            .order_by('user_id', 'friend_id')\
+            .values_list('user_id', 'friend_id')
+        return {user_id: array('i', (friend_id for _, friend_id in group))
+                for user_id, group in groupby(edges.iterator(), key=itemgetter(0))}
+
+    def are_friends(self, user_id, other_id):
+        return contains(self.friends(user_id), other_id)
+
+    def mutual_count(self, user_id, other_id):
+        lists = self.friends_of([user_id, other_id])
+        return intersection_size(lists[user_id], lists[other_id])
+
+    def mutual_counts(self, user_id, other_ids):
+        """Numbers of mutual friends of the user with every one of the others, by their id."""
+        lists = self.friends_of([user_id] + list(other_ids))
+        own = lists[user_id]
+        return {other_id: intersection_size(own, lists[other_id]) for other_id in other_ids}
+
+    def suggestions(self, user_id, limit=10):
+        """
+        Friends of friends who aren't friends of the user yet, as (id, mutual friend count)
+        pairs, the ones with most mutual friends first.
+        """
+        friends = self.friends(user_id)
+        counts = Counter()
+        for friend_ids in self.friends_of(friends).values():
+            counts.update(friend_ids)
+        counts.pop(user_id, None)
+        for friend_id in friends:
+            counts.pop(friend_id, None)
+        return heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def intersection_size(a, b):
+    """Number of common ids of two sorted arrays, searching the longer one for the shorter one's."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(1 for value in a if contains(b, value))
+
+
+graph = FriendGraph()
@@ -0,0 +1,241 @@
+"""
+Per-request instrumentation.
+
+``InstrumentationMiddleware`` counts the queries of every request and the time
+spent in them, along with the time spent serializing and the whole duration.
+Viewsets mixing in ``InstrumentedViewMixin`` name their requests after the
+action, e.g. ``events.list``. The numbers are:
+
+* aggregated per action into Prometheus metrics, served at ``/metrics/``,
+* sent back in a ``Server-Timing`` header, with ``settings.SERVER_TIMING``,
+* checked against the query budget an action declares with ``@query_budget``.
+  Going over it is logged, and raises inside ``enforce_query_budgets()``,
+  which is meant for tests.
+
+Every process keeps its own counters and adds them to the shared cache every
+``settings.METRICS_FLUSH_INTERVAL`` seconds, so that whichever process answers
+the scrape reports the totals of all of them.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERIES_KEY = 'metrics:series'
+
+local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats(object):
+    def __init__(self):
+        self.action = None
+        self.budget = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper, see ``connection.execute_wrapper``."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+def current_stats():
+    return getattr(local, 'stats', None)
+
+
+@contextmanager
+def timed_serialization():
+    """Counts the time spent inside as serialization time, nested serializers only once."""
+    stats = current_stats()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize_time += time.perf_counter() - start
+        stats.serializing = False
+
+
+def query_budget(queries):
+    """Declares how many queries a viewset action may make at most, auth included."""
+    def decorator(action):
+        action.query_budget = queries
+        return action
+    return decorator
+
+
+@contextmanager
+def enforce_query_budgets():
+    """Makes requests going over the query budget of their action raise QueryBudgetExceeded."""
+    local.enforce_budgets = True
+    try:
+        yield
+    finally:
+        local.enforce_budgets = False
+
+
+class InstrumentedViewMixin(object):
+    """Names the request after the viewset action and picks up its query budget."""
+    def initial(self, request, *args, **kwargs):
+        stats = current_stats()
+        if stats is not None:
+            action = getattr(self, 'action', None) or request.method.lower()
+            basename = getattr(self, 'basename', None) or type(self).__name__
+            stats.action = '%s.%s' % (basename, action)
+            stats.budget = getattr(getattr(self, action, None), 'query_budget', None)
+        super(InstrumentedViewMixin, self).initial(request, *args, **kwargs)
+
+
+class InstrumentationMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = local.stats = RequestStats()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            local.stats = None
+        duration = time.perf_counter() - start
+
+        if stats.action is None:
+            match = request.resolver_match
+            stats.action = match.view_name if match is not None and match.view_name else 'unknown'
+        over_budget = stats.budget is not None and stats.queries > stats.budget
+        metrics.observe(stats, response.status_code, duration, over_budget)
+        if over_budget:
+            message = "%s made %d queries, its budget is %d." % (stats.action, stats.queries, stats.budget)
+            if getattr(local, 'enforce_budgets', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = \
+                'db;dur=%.1f;desc="%d queries", serialize;dur=%.1f, total;dur=%.1f' % (
+                    stats.db_time * 1000, stats.queries, stats.serialize_time * 1000, duration * 1000)
+        return response
+
+
+def micros(seconds):
+    return int(seconds * 1000000)
+
+
+class Metrics(object):
+    """Counters per action, flushed to the shared cache. Durations are kept in microseconds."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.last_flush = time.monotonic()
+
+    def observe(self, stats, status_code, duration, over_budget):
+        action = stats.action
+        with self.lock:
+            pending = self.pending
+            pending['requests', action, str(status_code)] += 1
+            for bound in LATENCY_BUCKETS:
+                if duration <= bound:
+                    pending['bucket', action, repr(bound)] += 1
+            pending['bucket', action, '+Inf'] += 1
+            pending['duration', action] += micros(duration)
+            pending['queries', action] += stats.queries
+            pending['db', action] += micros(stats.db_time)
+            pending['serialize', action] += micros(stats.serialize_time)
+            if over_budget:
+                pending['over_budget', action] += 1
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+        cache = caches[settings.METRICS_CACHE_ALIAS]
+        keys = set()
+        for series, delta in pending.items():
+            key = 'metrics:' + '|'.join(series)
+            keys.add(key)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                cache.add(key, 0, None)
+                cache.incr(key, delta)
+        # Another process may overwrite new series, they are added back on its next flush.
+        known = cache.get(SERIES_KEY) or set()
+        if not keys <= known:
+            cache.set(SERIES_KEY, known | keys, None)
+
+    def collect(self):
+        """All the series of all processes, as {(kind, action, ...): value}."""
+        self.flush()
+        cache = caches[settings.METRICS_CACHE_ALIAS]
+        values = cache.get_many(list(cache.get(SERIES_KEY) or ()))
+        return {tuple(key[len('metrics:'):].split('|')): value for key, value in values.items()}
+
+
+metrics = Metrics()
+
+
+COUNTERS = (
+    ('queries', 'social_twist_db_queries_total', "Database queries made.", 1),
+    ('db', 'social_twist_db_seconds_total', "Time spent in database queries.", 1e-6),
+    ('serialize', 'social_twist_serialize_seconds_total', "Time spent serializing responses.", 1e-6),
+    ('over_budget', 'social_twist_query_budget_exceeded_total', "Requests over their query budget.", 1),
+)
+
+
+def prometheus_text(values):
+    """Renders collected metrics in the Prometheus text exposition format."""
+    def by_kind(kind):
+        return sorted((series[1:], value) for series, value in values.items() if series[0] == kind)
+
+    lines = ['# HELP social_twist_requests_total Requests served.',
+             '# TYPE social_twist_requests_total counter']
+    for (action, status_code), value in by_kind('requests'):
+        lines.append('social_twist_requests_total{action="%s",status="%s"} %d' % (action, status_code, value))
+
+    lines += ['# HELP social_twist_request_duration_seconds Time spent serving requests.',
+              '# TYPE social_twist_request_duration_seconds histogram']
+    durations = dict(by_kind('duration'))
+    buckets = defaultdict(dict)
+    for (action, bound), value in by_kind('bucket'):
+        buckets[action][bound] = value
+    for action in sorted(buckets):
+        for bound in [repr(bound) for bound in LATENCY_BUCKETS] + ['+Inf']:
+            lines.append('social_twist_request_duration_seconds_bucket{action="%s",le="%s"} %d' % (
+                action, bound, buckets[action].get(bound, 0)))
+        lines.append('social_twist_request_duration_seconds_sum{action="%s"} %.6f' % (
+            action, durations.get((action,), 0) * 1e-6))
+        lines.append('social_twist_request_duration_seconds_count{action="%s"} %d' % (
+            action, buckets[action].get('+Inf', 0)))
+
+    for kind, name, description, scale in COUNTERS:
+        lines += ['# HELP %s %s' % (name, description), '# TYPE %s counter' % name]
+        for (action,), value in by_kind(kind):
+            lines.append('%s{action="%s"} %s' % (name, action, value if scale == 1 else '%.6f' % (value * scale)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,149 @@
+"""
+A small background job queue.
+
+Jobs are plain functions registered with ``@job``, which take JSON serializable
+keyword arguments. ``enqueue`` hands them over to the executor configured in
+``settings.JOB_EXECUTOR``:
+
+* ``DatabaseExecutor`` stores them in the Job table, where the
+  ``./manage.py run_jobs`` workers pick them up.
+* ``InProcessExecutor`` runs them in the current process as soon as the
+  current transaction commits, which is what tests and development want.
+
+Failed jobs are retried with exponential backoff. An idempotency key makes sure
+a job is only enqueued once, however many times ``enqueue`` is called with it.
+"""
+import datetime
+import importlib
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from social_twist.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+
+
+def job(name=None, max_attempts=5):
+    def decorator(func):
+        JOBS[name or func.__name__] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def load_jobs():
+    importlib.import_module('social_twist.tasks')
+    return JOBS
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """
+    Schedules job ``name`` to run with ``payload`` as keyword arguments,
+    ``delay`` seconds from now at the earliest.
+    """
+    return get_executor().enqueue(name, payload or {}, key, delay)
+
+
+def get_executor():
+    return import_string(settings.JOB_EXECUTOR)()
+
+
+def backoff(attempts):
+    """Seconds to wait before the next attempt, after ``attempts`` failed ones."""
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+
+
+class DatabaseExecutor(object):
+    def enqueue(self, name, payload, key, delay):
+        values = {
+            'name': name,
+            'payload': payload,
+            'max_attempts': load_jobs()[name][1],
+            'run_at': timezone.now() + datetime.timedelta(seconds=delay),
+        }
+        if key is None:
+            return Job.objects.create(**values)
+        return Job.objects.get_or_create(idempotency_key=key, defaults=values)[0]
+
+
+class InProcessExecutor(object):
+    # Shared by every instance, as ``get_executor`` makes a new one each time.
+    # Only the latest ``max_keys`` keys are remembered, oldest forgotten first.
+    max_keys = 10000
+    keys = OrderedDict()
+    lock = threading.Lock()
+
+    @classmethod
+    def forget_keys(cls):
+        with cls.lock:
+            cls.keys.clear()
+
+    def enqueue(self, name, payload, key, delay):
+        if key is not None:
+            with self.lock:
+                if key in self.keys:
+                    return None
+                self.keys[key] = True
+                while len(self.keys) > self.max_keys:
+                    self.keys.popitem(last=False)
+        func = load_jobs()[name][0]
+        transaction.on_commit(lambda: func(**payload))
+        return None
+
+
+def perform(job_obj):
+    """Runs a job fetched from the queue and records how it went."""
+    job_obj.attempts += 1
+    try:
+        func = load_jobs()[job_obj.name][0]
+        with transaction.atomic():
+            func(**job_obj.payload)
+    except Exception:
+        job_obj.last_error = traceback.format_exc()
+        # A job nobody knows how to run won't get any better.
+        if job_obj.attempts >= job_obj.max_attempts or job_obj.name not in JOBS:
+            job_obj.status = Job.FAILED
+            logger.error("Job %s failed for good:\n%s", job_obj, job_obj.last_error)
+        else:
+            job_obj.run_at = timezone.now() + datetime.timedelta(seconds=backoff(job_obj.attempts))
+    else:
+        job_obj.status = Job.DONE
+        # Done jobs are kept for their idempotency key, not for what they were given.
+        job_obj.payload = {}
+    job_obj.save(update_fields=['attempts', 'status', 'run_at', 'last_error', 'payload'])
+
+
+def run_next():
+    """
+    Runs the next due job, if there's any. Returns whether there was one.
+    Several workers can run this at the same time, a locked job is skipped.
+    """
+    with transaction.atomic():
+        job_obj = Job.objects.select_for_update(skip_locked=True)\
+            .filter(status=Job.PENDING, run_at__lte=timezone.now())\
+            .order_by('run_at')\
+            .first()
+        if job_obj is None:
+            return False
+        perform(job_obj)
+    return True
+
+
+def work(interval=1.0, once=False):
+    """Runs jobs as they become due. With ``once`` stops when the queue is drained."""
+    while True:
+        close_old_connections()
+        while run_next():
+            pass
+        if once:
+            return
+        time.sleep(interval)
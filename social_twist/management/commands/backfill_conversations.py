@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from social_twist.models import ChatMessage, Conversation
+
+
+class Command(BaseCommand):
+    help = "Rebuilds chat inbox conversations from the existing chat messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        directions = ChatMessage.objects.order_by()\
+            .values('sender_id', 'receiver_id')\
+            .annotate(last_id=Max('id'), unread=Count('id', filter=Q(seen=False)))
+        conversations = {}
+        for direction in directions.iterator():
+            sender_id, receiver_id = direction['sender_id'], direction['receiver_id']
+            for owner_id, companion_id, unread in ((sender_id, receiver_id, 0),
+                                                   (receiver_id, sender_id, direction['unread'])):
+                entry = conversations.setdefault((owner_id, companion_id), {'last_id': 0, 'unread': 0})
+                entry['last_id'] = max(entry['last_id'], direction['last_id'])
+                entry['unread'] += unread
+
+        last_ids = sorted({entry['last_id'] for entry in conversations.values()})
+        timestamps = {}
+        for start in range(0, len(last_ids), batch_size):
+            timestamps.update(ChatMessage.objects.filter(id__in=last_ids[start:start + batch_size])
+                              .values_list('id', 'timestamp'))
+
+        with transaction.atomic():
+            Conversation.objects.all().delete()
+            Conversation.objects.bulk_create(
+                (Conversation(owner_id=owner_id,
+                              companion_id=companion_id,
+                              last_message_id=entry['last_id'],
+                              unread_count=entry['unread'],
+                              updated_at=timestamps[entry['last_id']])
+                 for (owner_id, companion_id), entry in conversations.items()),
+                batch_size=batch_size,
+            )
+        self.stdout.write("Rebuilt %d conversations." % len(conversations))
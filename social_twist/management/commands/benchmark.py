@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from social_twist.benchmarks import load_scenarios, summarize
+
+
+class Command(BaseCommand):
+    help = "Runs benchmark scenarios against the configured database. " \
+           "Data seeded by the scenarios is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help="Scenarios to run, all of them are listed when omitted.")
+        parser.add_argument('--scale', type=int, default=None,
+                            help="Size of the seeded dataset, each scenario has its own default.")
+        parser.add_argument('--repeat', type=int, default=50,
+                            help="Samples taken per measurement.")
+        parser.add_argument('--json', dest='json_path', default=None,
+                            help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        scenarios = load_scenarios()
+        if not options['scenarios']:
+            for name, func in scenarios.items():
+                self.stdout.write("%s\n    %s" % (name, (func.__doc__ or "").strip()))
+            return
+        unknown = set(options['scenarios']) - set(scenarios)
+        if unknown:
+            raise CommandError("Unknown scenarios: %s" % ", ".join(sorted(unknown)))
+
+        results = {}
+        for name in options['scenarios']:
+            results[name] = {}
+
+            def report(label, samples, name=name):
+                summary = summarize(samples)
+                results[name][label] = summary
+                self.stdout.write("%-20s %-30s n=%-5d p50=%8.2fms p95=%8.2fms p99=%8.2fms" % (
+                    name, label, summary['n'],
+                    summary['p50_ms'], summary['p95_ms'], summary['p99_ms']))
+
+            with transaction.atomic():
+                scenarios[name](report, scale=options['scale'], repeat=options['repeat'])
+                transaction.set_rollback(True)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(results, output, indent=2)
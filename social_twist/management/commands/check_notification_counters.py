@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from social_twist.models import NotificationCounter
+
+COUNTERS = NotificationCounter.objects.COUNTERS
+
+
+class Command(BaseCommand):
+    help = "Compares the unseen notification counters with the actual notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Overwrite wrong counters with the actual numbers.")
+
+    def handle(self, *args, **options):
+        zero = dict.fromkeys(COUNTERS, 0)
+        actual = NotificationCounter.objects.actual()
+        stored = {row['user_id']: row for row in
+                  NotificationCounter.objects.values('user_id', *COUNTERS).iterator()}
+
+        wrong = {}
+        for user_id in User.objects.values_list('id', flat=True).iterator():
+            expected = actual.get(user_id, zero)
+            current = stored.get(user_id)
+            if current is None or any(current[name] != expected[name] for name in COUNTERS):
+                wrong[user_id] = expected
+                self.stdout.write("User %d: stored %s, actual %s" % (
+                    user_id,
+                    None if current is None else {name: current[name] for name in COUNTERS},
+                    expected))
+        self.stdout.write("%d wrong counters." % len(wrong))
+
+        if options['fix'] and wrong:
+            with transaction.atomic():
+                NotificationCounter.objects.filter(user_id__in=list(wrong)).delete()
+                NotificationCounter.objects.bulk_create(
+                    (NotificationCounter(user_id=user_id, **counts) for user_id, counts in wrong.items()),
+                    batch_size=1000,
+                )
+            self.stdout.write("Fixed.")
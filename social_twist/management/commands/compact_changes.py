@@ -0,0 +1,28 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from social_twist.models import Change
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = "Deletes change log entries too old to be synced, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_RETENTION_DAYS,
+                            help="Keep the changes of this many last days.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        total = 0
+        while True:
+            ids = list(Change.objects.filter(timestamp__lt=cutoff).order_by('id')
+                       .values_list('id', flat=True)[:BATCH_SIZE])
+            if not ids:
+                break
+            total += Change.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write("Deleted %d changes." % total)
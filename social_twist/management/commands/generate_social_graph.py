@@ -0,0 +1,43 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from social_twist.benchmarks.social_graph import SocialGraphGenerator
+
+
+class Command(BaseCommand):
+    help = "Fills the database with a synthetic social network for load tests: users with " \
+           "profiles, a power-law friend graph, events around a few cities, chats, " \
+           "reactions and comments. Generated users are named gen_*."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--friends', type=int, default=20,
+                            help="Average number of friends per user.")
+        parser.add_argument('--events', type=int, default=2, help="Events per user.")
+        parser.add_argument('--messages', type=int, default=20, help="Chat messages per user.")
+        parser.add_argument('--reactions', type=int, default=10, help="Reactions per user.")
+        parser.add_argument('--comments', type=int, default=2, help="Comments per user.")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed of the random generator, the same seed generates the same network.")
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['friends'] >= options['users']:
+            raise CommandError("Users can't have %d friends on average among %d users."
+                               % (options['friends'], options['users']))
+        random.seed(options['seed'])
+        generator = SocialGraphGenerator(
+            users=options['users'],
+            friends=options['friends'],
+            events=options['events'],
+            messages=options['messages'],
+            reactions=options['reactions'],
+            comments=options['comments'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        with transaction.atomic():
+            generator.generate()
+        self.stdout.write("Done.")
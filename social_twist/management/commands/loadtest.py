@@ -0,0 +1,62 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from social_twist.benchmarks.loadtest import ENDPOINTS, make_plan, run
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Replays a mix of API requests, as users made by generate_social_graph, through " \
+           "the WSGI application, and reports throughput and latency percentiles per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=4, help="Threads sending requests.")
+        parser.add_argument('--warmup', type=int, default=100, help="Requests made before measuring.")
+        parser.add_argument('--users', type=int, default=100, help="Generated users to act as.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--endpoint', dest='endpoints', action='append', choices=list(ENDPOINTS),
+                            help="Only request this endpoint, can be given several times.")
+        parser.add_argument('--writes', action='store_true',
+                            help="Also like, attend and send messages. These change the database.")
+        parser.add_argument('--save-plan', default=None, help="Write the requests to this file.")
+        parser.add_argument('--plan', default=None, help="Replay the requests saved in this file.")
+        parser.add_argument('--json', dest='json_path', default=None,
+                            help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        if options['plan']:
+            with open(options['plan']) as source:
+                plan = json.load(source)
+        else:
+            try:
+                plan = make_plan(options['requests'] + options['warmup'], users=options['users'],
+                                 seed=options['seed'], writes=options['writes'],
+                                 endpoints=options['endpoints'])
+            except ValueError as error:
+                raise CommandError(str(error))
+        if options['save_plan']:
+            with open(options['save_plan'], 'w') as output:
+                json.dump(plan, output)
+
+        results = run(plan, concurrency=options['concurrency'], warmup=options['warmup'])
+        for name, result in list(results['endpoints'].items()) + [('total', results['total'])]:
+            self.stdout.write("%-30s n=%-6d err=%-4d %8.1f req/s p50=%8.2fms p95=%8.2fms p99=%8.2fms" % (
+                name, result.get('n', 0), result['errors'], result['throughput_rps'],
+                result.get('p50_ms', 0), result.get('p95_ms', 0), result.get('p99_ms', 0)))
+
+        if options['json_path']:
+            results['commit'] = current_commit()
+            results['options'] = {key: options[key] for key in
+                                  ('requests', 'concurrency', 'warmup', 'users', 'seed', 'endpoints',
+                                   'writes', 'plan')}
+            with open(options['json_path'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from social_twist.caching import bump
+from social_twist.models import Change, Event, EventReaction
+
+
+def reaction_count(**filters):
+    reactions = EventReaction.objects.filter(event=OuterRef('pk'), **filters)\
+        .order_by().values('event').annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(reactions, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recomputes event like/dislike counters from the event reactions. " \
+           "Meant to be run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the events whose counters drifted.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Event.objects.annotate(actual_likes=reaction_count(liked=True),
+                                   actual_dislikes=reaction_count(disliked=True))
+            .filter(~Q(likes=F('actual_likes')) | ~Q(dislikes=F('actual_dislikes')))
+            .order_by().values_list('pk', flat=True)
+        )
+        self.stdout.write("%d events have drifted counters." % len(drifted))
+        if options['dry_run']:
+            return
+        batch_size = options['batch_size']
+        for start in range(0, len(drifted), batch_size):
+            event_ids = drifted[start:start + batch_size]
+            with transaction.atomic():
+                Event.objects.filter(pk__in=event_ids)\
+                    .update(likes=reaction_count(liked=True),
+                            dislikes=reaction_count(disliked=True))
+                Change.objects.record_events(event_ids)
+            bump(*['event:%d' % pk for pk in event_ids])
+        self.stdout.write("Counters fixed.")
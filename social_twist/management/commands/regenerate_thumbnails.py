@@ -0,0 +1,47 @@
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from social_twist.tasks import THUMBNAIL_SOURCES, generate_thumbnails
+
+
+def regenerate(item):
+    model, pk = item
+    generate_thumbnails(model, pk)
+    return item
+
+
+class Command(BaseCommand):
+    help = "Renders the thumbnails of every stored picture again, across a pool of processes."
+
+    def add_arguments(self, parser):
+        # Checked in handle(): with choices, argparse before Python 3.12 rejects an empty list.
+        parser.add_argument('models', nargs='*',
+                            help="Kinds of pictures to regenerate, among %s, all of them by default."
+                                 % ", ".join(sorted(THUMBNAIL_SOURCES)))
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Size of the process pool, the number of CPUs by default.")
+        parser.add_argument('--missing', action='store_true',
+                            help="Only pictures which have no thumbnails yet.")
+
+    def handle(self, *args, **options):
+        models = options['models'] or sorted(THUMBNAIL_SOURCES)
+        unknown = set(models) - set(THUMBNAIL_SOURCES)
+        if unknown:
+            raise CommandError("Unknown kinds of pictures: %s" % ", ".join(sorted(unknown)))
+        items = []
+        for model in models:
+            model_class, field = THUMBNAIL_SOURCES[model]
+            queryset = model_class.objects.exclude(**{field: ''}).exclude(**{field + '__isnull': True})
+            if options['missing']:
+                queryset = queryset.filter(thumbnails={})
+            items.extend((model, pk) for pk in queryset.values_list('pk', flat=True).iterator())
+
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        with Pool(options['processes']) as pool:
+            for done, _ in enumerate(pool.imap_unordered(regenerate, items, chunksize=16), 1):
+                if done % 100 == 0:
+                    self.stdout.write("%d/%d" % (done, len(items)))
+        self.stdout.write("Regenerated thumbnails of %d pictures." % len(items))
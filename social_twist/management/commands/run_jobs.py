@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from social_twist.jobs import load_jobs, work
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs from the database queue. Several workers can run at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to sleep when there's nothing to do.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit as soon as the queue is drained.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Running jobs: %s" % ", ".join(sorted(load_jobs())))
+        work(interval=options['interval'], once=options['once'])
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.2 on 2026-10-17 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0006_conversation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'receiver', 'id'], name='chat_thread_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.0.2 on 2026-10-17 11:41
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_reactions(apps, schema_editor):
+    EventReaction = apps.get_model('social_twist', 'EventReaction')
+    duplicates = EventReaction.objects.order_by()\
+        .values('person_id', 'event_id')\
+        .annotate(first_id=Min('id'), count=Count('id'))\
+        .filter(count__gt=1)
+    for duplicate in duplicates:
+        EventReaction.objects.filter(person_id=duplicate['person_id'],
+                                     event_id=duplicate['event_id'])\
+            .exclude(id=duplicate['first_id'])\
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('social_twist', '0007_chatmessage_thread_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reactions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='eventreaction',
+            unique_together={('person', 'event')},
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.0.2 on 2026-10-17 12:20
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+# Event coordinates become geography, so that distance searches can use ST_DWithin
+# with the GiST index. The index is rebuilt by hand, as the one made for geometry
+# uses an operator class geography doesn't have.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0008_eventreaction_unique'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        'DROP INDEX IF EXISTS "social_twist_event_coordinates_id"',
+                        'ALTER TABLE "social_twist_event" ALTER COLUMN "coordinates" '
+                        'TYPE geography(POINT, 4326) USING "coordinates"::geography(POINT, 4326)',
+                        'CREATE INDEX "social_twist_event_coordinates_id" '
+                        'ON "social_twist_event" USING GIST ("coordinates")',
+                    ],
+                    reverse_sql=[
+                        'DROP INDEX IF EXISTS "social_twist_event_coordinates_id"',
+                        'ALTER TABLE "social_twist_event" ALTER COLUMN "coordinates" '
+                        'TYPE geometry(POINT, 4326) USING "coordinates"::geometry(POINT, 4326)',
+                        'CREATE INDEX "social_twist_event_coordinates_id" '
+                        'ON "social_twist_event" USING GIST ("coordinates")',
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='event',
+                    name='coordinates',
+                    field=django.contrib.gis.db.models.fields.PointField(blank=True, geography=True, srid=4326),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.0.2 on 2026-10-17 13:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0009_event_coordinates_geography'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_idx'),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE "social_twist_event" SET "search_vector" = '
+                'setweight(to_tsvector(COALESCE("social_twist_event"."title", \'\')), \'A\') || '
+                'setweight(to_tsvector(COALESCE("auth_user"."first_name" || \' \' || "auth_user"."last_name", \'\')), \'B\') || '
+                'setweight(to_tsvector(COALESCE("social_twist_event"."location", \'\')), \'B\') || '
+                'setweight(to_tsvector(COALESCE("social_twist_event"."description", \'\')), \'C\') '
+                'FROM "auth_user" WHERE "auth_user"."id" = "social_twist_event"."creator_id"',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX "event_title_trgm_idx" ON "social_twist_event" USING GIN ("title" gin_trgm_ops)',
+            reverse_sql='DROP INDEX "event_title_trgm_idx"',
+        ),
+    ]
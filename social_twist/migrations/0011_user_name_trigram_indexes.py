@@ -0,0 +1,35 @@
+# Generated by Django 2.0.2 on 2026-10-17 13:48
+
+from django.conf import settings
+from django.db import migrations
+
+
+# Trigram indexes for people search. The plain ones serve similarity matches,
+# the UPPER() ones the case insensitive prefix matches.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('social_twist', '0010_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'CREATE INDEX "auth_user_first_name_trgm_idx" ON "auth_user" '
+                'USING GIN ("first_name" gin_trgm_ops)',
+                'CREATE INDEX "auth_user_last_name_trgm_idx" ON "auth_user" '
+                'USING GIN ("last_name" gin_trgm_ops)',
+                'CREATE INDEX "auth_user_first_name_upper_trgm_idx" ON "auth_user" '
+                'USING GIN (UPPER("first_name") gin_trgm_ops)',
+                'CREATE INDEX "auth_user_last_name_upper_trgm_idx" ON "auth_user" '
+                'USING GIN (UPPER("last_name") gin_trgm_ops)',
+            ],
+            reverse_sql=[
+                'DROP INDEX "auth_user_first_name_trgm_idx"',
+                'DROP INDEX "auth_user_last_name_trgm_idx"',
+                'DROP INDEX "auth_user_first_name_upper_trgm_idx"',
+                'DROP INDEX "auth_user_last_name_upper_trgm_idx"',
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.0.2 on 2026-10-17 15:12
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+from django.utils import timezone
+
+# Kind of picture -> (model, picture field), as in social_twist.tasks.THUMBNAIL_SOURCES.
+PICTURES = {
+    'user': ('CustomUserData', 'picture'),
+    'event': ('Event', 'picture'),
+    'image': ('Image', 'image'),
+}
+
+
+def enqueue_thumbnails(apps, schema_editor):
+    """
+    Queues the thumbnails of every picture stored so far, for the run_jobs
+    workers, with the idempotency keys of social_twist.tasks.
+    """
+    Job = apps.get_model('social_twist', 'Job')
+    now = timezone.now()
+    for kind, (model_name, field) in PICTURES.items():
+        model = apps.get_model('social_twist', model_name)
+        pictures = model.objects.exclude(**{field: ''}).exclude(**{field + '__isnull': True})\
+            .order_by('pk').values_list('pk', field)
+        jobs = [Job(name='generate_thumbnails', payload={'model': kind, 'pk': pk}, max_attempts=5, run_at=now,
+                    idempotency_key='thumbnail:%s:%d:%s' % (kind, pk, name))
+                for pk, name in pictures.iterator()]
+        Job.objects.bulk_create(jobs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0012_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuserdata',
+            name='thumbnails',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='thumbnails',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='thumbnails',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunPython(enqueue_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.0.2 on 2026-10-17 16:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('social_twist', '0014_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('invitations', models.PositiveIntegerField(default=0)),
+                ('friend_requests', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            sql='INSERT INTO "social_twist_notificationcounter" '
+                '("user_id", "messages", "invitations", "friend_requests") '
+                'SELECT "auth_user"."id", '
+                '(SELECT COUNT(*) FROM "social_twist_chatmessage" m '
+                'WHERE m."receiver_id" = "auth_user"."id" AND NOT m."seen"), '
+                '(SELECT COUNT(*) FROM "social_twist_invitation" i '
+                'WHERE i."receiver_id" = "auth_user"."id" AND NOT i."seen"), '
+                '(SELECT COUNT(*) FROM "social_twist_friendrequest" f '
+                'WHERE f."receiver_id" = "auth_user"."id" AND NOT f."seen") '
+                'FROM "auth_user"',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.0.2 on 2026-10-17 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('social_twist', '0016_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendship',
+            unique_together={('user', 'friend')},
+        ),
+        # Friendships so far were one-directional rows of CustomUserData.friends,
+        # usually added on both sides. Every one of them becomes an edge both ways.
+        migrations.RunSQL(
+            sql='INSERT INTO "social_twist_friendship" ("user_id", "friend_id", "timestamp") '
+                'SELECT "user_id", "friend_id", now() FROM ('
+                'SELECT d."user_id" AS "user_id", f."user_id" AS "friend_id" '
+                'FROM "social_twist_customuserdata_friends" f '
+                'JOIN "social_twist_customuserdata" d ON d."id" = f."customuserdata_id" '
+                'UNION '
+                'SELECT f."user_id", d."user_id" '
+                'FROM "social_twist_customuserdata_friends" f '
+                'JOIN "social_twist_customuserdata" d ON d."id" = f."customuserdata_id"'
+                ') edges WHERE "user_id" <> "friend_id"',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
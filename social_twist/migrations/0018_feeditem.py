@@ -0,0 +1,45 @@
+# Generated by Django 2.0.2 on 2026-10-17 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('social_twist', '0017_friendship'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='social_twist.Event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='feeditem',
+            unique_together={('user', 'event')},
+        ),
+        # Feeds read the few events that weren't fanned out by creator.
+        migrations.RunSQL(
+            sql='CREATE INDEX "event_not_fanned_out_idx" ON "social_twist_event" ("creator_id", "id") '
+                'WHERE NOT "fanned_out"',
+            reverse_sql='DROP INDEX "event_not_fanned_out_idx"',
+        ),
+        migrations.RunSQL(
+            sql='INSERT INTO "social_twist_feeditem" ("user_id", "event_id") '
+                'SELECT f."friend_id", e."id" FROM "social_twist_event" e '
+                'JOIN "social_twist_friendship" f ON f."user_id" = e."creator_id"',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.2 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0018_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['event', 'id'], name='comment_event_idx'),
+        ),
+    ]
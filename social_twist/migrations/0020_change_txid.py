@@ -0,0 +1,26 @@
+# Generated by Django 2.0.2 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_twist', '0019_comment_event_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='change',
+            name='change_sync_idx',
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'txid', 'id'], name='change_sync_idx'),
+        ),
+    ]
@@ -1,10 +1,22 @@
 import datetime
+import os
+import uuid
+from collections import Counter, defaultdict
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.gis.db.models import PointField
-from imagekit.models import ImageSpecField
-from imagekit.processors import ResizeToFill
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+
+from social_twist.caching import bump_on_commit
 
 
 def default_birthday():
@@ -16,7 +28,7 @@ class CustomUserData(models.Model):
                                 related_name='info')
     location = models.CharField(max_length=1024, blank=True)
     picture = models.ImageField(null=True)
-    thumbnail = ImageSpecField(source="picture", processors=[ResizeToFill(80, 80)], format="PNG")
+    thumbnails = JSONField(default=dict, editable=False)
     phone_number = models.CharField(max_length=1024, blank=True)
     friends = models.ManyToManyField(User, blank=True)
     is_ios = models.BooleanField(default=False)
@@ -34,22 +46,91 @@ class Event(models.Model):
     attenders = models.ManyToManyField(User, related_name='events')
     start_time = models.DateTimeField()
     picture = models.ImageField(null=True)
-    thumbnail = ImageSpecField(source="picture", processors=[ResizeToFill(80, 80)], format="PNG")
+    thumbnails = JSONField(default=dict, editable=False)
     video = models.FileField(null=True)
-    coordinates = PointField(blank=True)
+    coordinates = PointField(blank=True, geography=True)
     location = models.CharField(max_length=1024, blank=True)
     type = models.CharField(max_length=1024, blank=True)
     is_private = models.BooleanField(default=False)
     likes = models.IntegerField(default=0)
     dislikes = models.IntegerField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Whether the event got copied into the feeds of the creator's friends,
+    # see FeedItem. Events of people with too many friends are read from the
+    # event table instead.
+    fanned_out = models.BooleanField(default=True, editable=False)
 
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='event_search_idx'),
+        ]
 
     def __str__(self):
         return "[%d] %s (%s) by %s" % (self.id, self.title, self.start_time.isoformat(), self.creator)
 
 
+SEARCHED_EVENT_FIELDS = {'title', 'description', 'location'}
+
+
+def event_search_vector(creator):
+    """
+    Text search document of an event. The creator's name is baked in,
+    as an update can't join the user table.
+    """
+    creator_name = "%s %s" % (creator.first_name, creator.last_name)
+    return (SearchVector('title', weight='A') +
+            SearchVector(Value(creator_name), weight='B') +
+            SearchVector('location', weight='B') +
+            SearchVector('description', weight='C'))
+
+
+@receiver(post_save, sender=Event)
+def update_event_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHED_EVENT_FIELDS.intersection(update_fields):
+        return
+    Event.objects.filter(pk=instance.pk).update(search_vector=event_search_vector(instance.creator))
+
+
+@receiver(post_save, sender=User)
+def update_creator_search_vectors(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'first_name', 'last_name'}.intersection(update_fields):
+        return
+    Event.objects.filter(creator=instance).update(search_vector=event_search_vector(instance))
+
+
+class ChatMessageQuerySet(models.QuerySet):
+    def between(self, user_id, companion_id):
+        """Messages either of the two users sent to the other one."""
+        return self.filter(Q(sender_id=user_id, receiver_id=companion_id) |
+                           Q(sender_id=companion_id, receiver_id=user_id))
+
+    def mark_seen(self, user_id, companion_ids):
+        """
+        Marks the chats of the user with every one of the companions seen, with
+        set-based updates, moving the unseen counters and conversations along.
+        """
+        companion_ids = set(companion_ids)
+        if not companion_ids:
+            return
+        with transaction.atomic():
+            unseen = self.filter(Q(sender_id=user_id, receiver_id__in=companion_ids) |
+                                 Q(sender_id__in=companion_ids, receiver_id=user_id), seen=False)
+            messages = list(unseen.select_for_update().values_list('id', 'sender_id', 'receiver_id'))
+            self.filter(id__in=[message_id for message_id, _, _ in messages]).update(seen=True)
+
+            received = Counter(receiver_id for _, _, receiver_id in messages)
+            by_delta = defaultdict(list)
+            for receiver_id, count in received.items():
+                by_delta[-count].append(receiver_id)
+            for delta, user_ids in by_delta.items():
+                NotificationCounter.objects.add(user_ids, messages=delta)
+            Change.objects.record_each(Change.MESSAGE, [(user_id, message_id)
+                                                        for message_id, sender_id, receiver_id in messages
+                                                        for user_id in (sender_id, receiver_id)])
+            Conversation.objects.messages_seen(user_id, companion_ids)
+
+
 class ChatMessage(models.Model):
     """
     Really awkward looking, but should get deal done.
@@ -62,8 +143,86 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now=True)
     seen = models.BooleanField(default=False)
 
+    objects = ChatMessageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['sender', 'receiver', 'id'], name='chat_thread_idx'),
+        ]
+
+
+class ConversationManager(models.Manager):
+    """
+    Keeps conversations in step with chat messages.
+    Every chat has two conversations, one per side, so the inbox of a user
+    is a plain indexed lookup by owner.
+    """
+
+    def message_sent(self, message):
+        with transaction.atomic():
+            self._touch(message.sender_id, message.receiver_id, message, 0)
+            self._touch(message.receiver_id, message.sender_id, message, 1)
+
+    def messages_seen(self, user_id, companion_ids):
+        self.filter(Q(owner_id=user_id, companion_id__in=companion_ids) |
+                    Q(owner_id__in=companion_ids, companion_id=user_id)).update(unread_count=0)
+
+    def message_deleted(self, message):
+        """Should be called once ``message`` is deleted."""
+        with transaction.atomic():
+            if not message.seen:
+                self.filter(owner_id=message.receiver_id, companion_id=message.sender_id)\
+                    .update(unread_count=Greatest(F('unread_count') - 1, 0))
+            pair = self.filter(Q(owner_id=message.sender_id, companion_id=message.receiver_id) |
+                               Q(owner_id=message.receiver_id, companion_id=message.sender_id))
+            latest = ChatMessage.objects.between(message.sender_id, message.receiver_id)\
+                .order_by('-id').first()
+            if latest is None:
+                pair.delete()
+            else:
+                pair.update(last_message=latest, updated_at=latest.timestamp)
+
+    def _touch(self, owner_id, companion_id, message, unread):
+        conversation = self.filter(owner_id=owner_id, companion_id=companion_id)
+        values = {
+            'last_message': message,
+            'updated_at': message.timestamp,
+            'unread_count': F('unread_count') + unread,
+        }
+        if conversation.update(**values):
+            return
+        try:
+            with transaction.atomic():
+                self.create(owner_id=owner_id, companion_id=companion_id,
+                            last_message=message, updated_at=message.timestamp,
+                            unread_count=unread)
+        except IntegrityError:
+            # Somebody else has just created it.
+            conversation.update(**values)
+
+
+class Conversation(models.Model):
+    """
+    Inbox entry of ``owner`` for the chat with ``companion``.
+    Denormalized from ChatMessage, see ConversationManager.
+    """
+    owner = models.ForeignKey(User, models.CASCADE,
+                              related_name="conversations")
+    companion = models.ForeignKey(User, models.CASCADE,
+                                  related_name="+")
+    last_message = models.ForeignKey(ChatMessage, models.SET_NULL,
+                                     null=True, related_name="+")
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    objects = ConversationManager()
+
+    class Meta:
+        unique_together = ('owner', 'companion')
+        indexes = [
+            models.Index(fields=['owner', '-updated_at'], name='conversation_inbox_idx'),
+        ]
 
 
 class Invitation(models.Model):
@@ -83,6 +242,24 @@ class Invitation(models.Model):
         return "%s invites %s to %s" % (self.sender, self.receiver, self.event)
 
 
+class FriendRequestManager(models.Manager):
+    def respond(self, user, request_id, accept):
+        """
+        Drops a friend request the user sent or received, accepting it first
+        if asked to and the user is its receiver. Returns False if the user has
+        no such request.
+        """
+        friend_request = self.select_related('sender__info', 'receiver__info')\
+            .filter(Q(sender=user) | Q(receiver=user), pk=request_id).first()
+        if friend_request is None:
+            return False
+        with transaction.atomic():
+            if accept and friend_request.receiver_id == user.id:
+                Friendship.objects.befriend(friend_request.receiver, friend_request.sender)
+            friend_request.delete()
+        return True
+
+
 class FriendRequest(models.Model):
     sender = models.ForeignKey(User, models.CASCADE,
                                related_name="sent_friend_requests")
@@ -91,6 +268,8 @@ class FriendRequest(models.Model):
     timestamp = models.DateTimeField(auto_now=True)
     seen = models.BooleanField(default=False)
 
+    objects = FriendRequestManager()
+
     class Meta:
         ordering = ['-timestamp']
 
@@ -98,12 +277,241 @@ class FriendRequest(models.Model):
         return "%s wants to be friends with %s" % (self.sender, self.receiver)
 
 
+class FriendshipManager(models.Manager):
+    def befriend(self, user, friend):
+        """Makes the two users friends of each other."""
+        with transaction.atomic():
+            for a, b in ((user, friend), (friend, user)):
+                self.get_or_create(user=a, friend=b)
+                a.info.friends.add(b)
+            FeedItem.objects.befriended(user.id, friend.id)
+            friends_changed_for(user.id, friend.id)
+
+    def unfriend(self, user, friend):
+        """Ends the friendship of the two users, on both sides."""
+        with transaction.atomic():
+            self.filter(Q(user=user, friend=friend) | Q(user=friend, friend=user)).delete()
+            user.info.friends.remove(friend)
+            friend.info.friends.remove(user)
+            FeedItem.objects.unfriended(user.id, friend.id)
+            friends_changed_for(user.id, friend.id)
+
+
+def friends_changed_for(*user_ids):
+    """Tells every process to reload the cached friends of the users, see social_twist.friends."""
+    bump_on_commit(*['friends:%d' % user_id for user_id in user_ids])
+
+
+class Friendship(models.Model):
+    """
+    Friendships as edges of a graph, stored in both directions, so that the friends
+    of a user are always found by ``user``. ``CustomUserData.friends`` is kept in step
+    by ``Friendship.objects.befriend`` and ``unfriend``.
+    """
+    user = models.ForeignKey(User, models.CASCADE, related_name='friendships')
+    friend = models.ForeignKey(User, models.CASCADE, related_name='+')
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    objects = FriendshipManager()
+
+    class Meta:
+        unique_together = ('user', 'friend')
+
+    def __str__(self):
+        return "%s is friends with %s" % (self.user, self.friend)
+
+
+class FeedItemManager(models.Manager):
+    def fan_out(self, event):
+        """Puts the event into the feeds of all the friends of its creator."""
+        self.execute_insert(
+            'SELECT "friend_id", %s FROM "{friendship}" WHERE "user_id" = %s',
+            [event.pk, event.creator_id])
+
+    def befriended(self, user_id, friend_id):
+        """Brings the fanned out events of each of the two new friends into the other's feed."""
+        for reader_id, creator_id in ((user_id, friend_id), (friend_id, user_id)):
+            self.execute_insert(
+                'SELECT %s, "id" FROM "{event}" WHERE "creator_id" = %s AND "fanned_out"',
+                [reader_id, creator_id])
+
+    def unfriended(self, user_id, friend_id):
+        self.filter(Q(user_id=user_id, event__creator_id=friend_id) |
+                    Q(user_id=friend_id, event__creator_id=user_id)).delete()
+
+    def execute_insert(self, select, params):
+        sql = 'INSERT INTO "{feed}" ("user_id", "event_id") ' + select + \
+              ' ON CONFLICT ("user_id", "event_id") DO NOTHING'
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(feed=FeedItem._meta.db_table,
+                                      friendship=Friendship._meta.db_table,
+                                      event=Event._meta.db_table), params)
+
+
+class FeedItem(models.Model):
+    """
+    Event in the feed of a friend of its creator, written when the event gets created
+    or the two become friends, so that reading a feed is a single index range scan.
+    Deleted events leave the feeds through the cascade.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, models.CASCADE, related_name='+')
+    event = models.ForeignKey(Event, models.CASCADE, related_name='feed_items')
+
+    objects = FeedItemManager()
+
+    class Meta:
+        unique_together = ('user', 'event')
+
+
+@receiver(pre_save, sender=Event)
+def decide_fan_out(sender, instance, **kwargs):
+    if instance.pk is None:
+        limit = settings.FEED_FANOUT_MAX_FRIENDS
+        instance.fanned_out = Friendship.objects.filter(user_id=instance.creator_id)[:limit + 1].count() <= limit
+
+
+@receiver(post_save, sender=Event)
+def fan_out_event(sender, instance, created, **kwargs):
+    if created and instance.fanned_out:
+        FeedItem.objects.fan_out(instance)
+
+
+class NotificationCounterManager(models.Manager):
+    COUNTERS = ('messages', 'invitations', 'friend_requests')
+
+    def add(self, user_ids, **deltas):
+        """
+        Moves the given counters of the users, e.g. ``add([user.id], messages=1)``.
+        Users without a counter yet get one.
+        """
+        values = {name: Greatest(F(name) + delta, 0) for name, delta in deltas.items() if delta}
+        if not values or not user_ids:
+            return
+        user_ids = set(user_ids)
+        with transaction.atomic():
+            counters = self.filter(user_id__in=user_ids)
+            counters.update(**values)
+            missing = user_ids - set(counters.values_list('user_id', flat=True))
+            if not missing:
+                return
+            initial = {name: max(delta, 0) for name, delta in deltas.items()}
+            try:
+                with transaction.atomic():
+                    self.bulk_create(NotificationCounter(user_id=user_id, **initial)
+                                     for user_id in missing)
+            except IntegrityError:
+                # Somebody else has just created some of them.
+                self.filter(user_id__in=missing).update(**values)
+
+    def reset(self, user_id, *counters):
+        self.filter(user_id=user_id).update(**{name: 0 for name in counters})
+
+    def actual(self):
+        """Counts the unseen notifications of every user from scratch, by user id."""
+        result = {}
+        sources = (
+            ('messages', ChatMessage.objects.filter(seen=False)),
+            ('invitations', Invitation.objects.filter(seen=False)),
+            ('friend_requests', FriendRequest.objects.filter(seen=False)),
+        )
+        for name, queryset in sources:
+            counts = queryset.order_by().values('receiver_id').annotate(count=models.Count('id'))
+            for row in counts.iterator():
+                result.setdefault(row['receiver_id'], dict.fromkeys(self.COUNTERS, 0))[name] = row['count']
+        return result
+
+
+class NotificationCounter(models.Model):
+    """
+    Unseen notifications of a user. Kept up to date along with the writes
+    creating and seeing them, so that reading them is a primary key lookup.
+    """
+    user = models.OneToOneField(User, models.CASCADE, primary_key=True,
+                                related_name='notification_counter')
+    messages = models.PositiveIntegerField(default=0)
+    invitations = models.PositiveIntegerField(default=0)
+    friend_requests = models.PositiveIntegerField(default=0)
+
+    objects = NotificationCounterManager()
+
+
+class EventReactionManager(models.Manager):
+    def react(self, person, event_id, liked):
+        """
+        Makes ``person`` like (or dislike) the event, moving the event counters
+        with atomic updates in the same transaction. Returns False if the
+        person had already reacted that way.
+        """
+        with transaction.atomic():
+            reaction = self.select_for_update().get_or_create(person=person, event_id=event_id)[0]
+            if reaction.liked == liked and reaction.disliked != liked:
+                return False
+            likes = int(liked) - int(reaction.liked)
+            dislikes = int(not liked) - int(reaction.disliked)
+            reaction.liked, reaction.disliked = liked, not liked
+            reaction.save(update_fields=['liked', 'disliked'])
+            Event.objects.filter(pk=event_id).update(likes=F('likes') + likes,
+                                                     dislikes=F('dislikes') + dislikes)
+            Change.objects.record_events([event_id])
+            return True
+
+    def react_many(self, person, reactions):
+        """
+        ``react`` for many events at once, ``reactions`` maps the ids of existing
+        events to whether the person likes them. Reactions and event counters are
+        written with set-based statements. Returns the ids of the events whose
+        reaction changed.
+        """
+        if not reactions:
+            return set()
+        with transaction.atomic():
+            existing = {event_id: (liked, disliked) for event_id, liked, disliked in
+                        self.select_for_update().filter(person=person, event_id__in=reactions)
+                        .values_list('event_id', 'liked', 'disliked')}
+            missing = [event_id for event_id in reactions if event_id not in existing]
+            try:
+                with transaction.atomic():
+                    self.bulk_create(EventReaction(person=person, event_id=event_id, liked=reactions[event_id],
+                                                   disliked=not reactions[event_id])
+                                     for event_id in missing)
+            except IntegrityError:
+                # Somebody else has just reacted to some of them, as the same person.
+                return {event_id for event_id, liked in reactions.items() if self.react(person, event_id, liked)}
+
+            switched = defaultdict(list)  # liked -> ids of the events whose reaction switched to it
+            deltas = defaultdict(list)  # (likes, dislikes) -> ids of the events to move by that much
+            for event_id, liked in reactions.items():
+                before = existing.get(event_id, (False, False))
+                if before == (liked, not liked):
+                    continue
+                if event_id in existing:
+                    switched[liked].append(event_id)
+                deltas[int(liked) - int(before[0]), int(not liked) - int(before[1])].append(event_id)
+            for liked, event_ids in switched.items():
+                self.filter(person=person, event_id__in=event_ids).update(liked=liked, disliked=not liked)
+            for (likes, dislikes), event_ids in deltas.items():
+                Event.objects.filter(pk__in=event_ids).update(likes=F('likes') + likes,
+                                                              dislikes=F('dislikes') + dislikes)
+            changed = {event_id for event_ids in deltas.values() for event_id in event_ids}
+            # Bulk writes send no signals.
+            Change.objects.record_events(changed)
+            if changed:
+                bump_on_commit('activity:%d' % person.id, *['event:%d' % event_id for event_id in changed])
+            return changed
+
+
 class EventReaction(models.Model):
     person = models.ForeignKey(User, models.CASCADE)
     event = models.ForeignKey(Event, models.CASCADE)
     liked = models.BooleanField(default=False)
     disliked = models.BooleanField(default=False)
 
+    objects = EventReactionManager()
+
+    class Meta:
+        unique_together = ('person', 'event')
+
 
 class Comment(models.Model):
     author = models.ForeignKey(User, models.CASCADE)
@@ -113,9 +521,273 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['event', 'id'], name='comment_event_idx'),
+        ]
 
 
 class Image(models.Model):
     image = models.ImageField()
-    thumbnail = ImageSpecField(source="image", processors=[ResizeToFill(80, 80)], format="PNG")
+    thumbnails = JSONField(default=dict, editable=False)
     owner = models.ForeignKey(User, models.CASCADE, related_name='images')
+
+
+class ChangeManager(models.Manager):
+    def horizon(self):
+        """
+        Id of the oldest transaction still running. Every change logged by an
+        older transaction is visible by now, no other one can ever show up.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+            return cursor.fetchone()[0]
+
+    def record(self, kind, object_ids, user_ids, deleted=False):
+        """Logs that the objects changed (or got deleted) for every one of the users."""
+        self.record_each(kind, [(user_id, object_id)
+                                for user_id in set(user_ids)
+                                for object_id in set(object_ids)], deleted)
+
+    def record_each(self, kind, changes, deleted=False):
+        """Logs changes given as (user id, object id) pairs."""
+        txid = Func(function='txid_current', output_field=models.BigIntegerField())
+        self.bulk_create(Change(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted, txid=txid)
+                         for user_id, object_id in changes)
+
+    def record_events(self, event_ids, deleted=False):
+        """Logs that the events changed for their creators and attenders."""
+        event_ids = set(event_ids)
+        if not event_ids:
+            return
+        changes = set(Event.attenders.through.objects.filter(event_id__in=event_ids)
+                      .values_list('user_id', 'event_id'))
+        changes.update(Event.objects.filter(id__in=event_ids).values_list('creator_id', 'id'))
+        self.record_each(Change.EVENT, changes, deleted)
+
+
+class Change(models.Model):
+    """
+    Append-only log of changes to what a user sees, replayed to clients by /sync/.
+    Entries older than ``settings.SYNC_RETENTION_DAYS`` get compacted away.
+
+    Ids are handed out before the transactions logging them commit, so they
+    don't commit in order. Changes are replayed by ``txid``, the transaction
+    that logged them, up to the ``horizon()`` below which every transaction
+    has finished.
+    """
+    EVENT = 'event'
+    MESSAGE = 'message'
+    INVITATION = 'invitation'
+    FRIEND = 'friend'
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=16, choices=[(EVENT, "Event"), (MESSAGE, "Message"),
+                                                    (INVITATION, "Invitation"), (FRIEND, "Friend")])
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    txid = models.BigIntegerField(default=0, editable=False)
+
+    objects = ChangeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'txid', 'id'], name='change_sync_idx'),
+        ]
+
+
+class Upload(models.Model):
+    """
+    A file being uploaded in chunks, see UploadView.
+    Chunks are written straight into ``partial_path``, which is moved into
+    the media storage once the upload is complete.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.UPLOAD_PARTIAL_DIR, str(self.id))
+
+    @property
+    def completed(self):
+        return self.offset == self.size
+
+
+class Job(models.Model):
+    """
+    A unit of background work, see ``social_twist.jobs``.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    name = models.CharField(max_length=255)
+    payload = JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=255, null=True, unique=True)
+    status = models.CharField(max_length=16, default=PENDING,
+                              choices=[(PENDING, "Pending"), (DONE, "Done"), (FAILED, "Failed")])
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.name, self.payload, self.status)
+
+
+# Invalidation of cached responses, see social_twist.caching. Versions are
+# bumped once the transaction commits, per object:
+# ``person:<user id>`` covers a person's name, pictures and images,
+# ``user:<user id>`` their list of friends,
+# ``event:<event id>`` an event, its attenders, reactions and comments,
+# ``activity:<user id>`` which events a user created, attends or liked.
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    bump_on_commit('person:%d' % instance.pk)
+
+
+@receiver(post_save, sender=CustomUserData)
+def profile_changed(sender, instance, **kwargs):
+    bump_on_commit('person:%d' % instance.user_id)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance, **kwargs):
+    bump_on_commit('person:%d' % instance.owner_id)
+
+
+@receiver(m2m_changed, sender=CustomUserData.friends.through)
+def friends_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        bump_on_commit('user:%d' % instance.pk)
+    else:
+        bump_on_commit('user:%d' % instance.user_id, *['user:%d' % pk for pk in pk_set or ()])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    bump_on_commit('event:%d' % instance.pk, 'activity:%d' % instance.creator_id)
+
+
+@receiver(m2m_changed, sender=Event.attenders.through)
+def attenders_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        event_ids, user_ids = list(instance.events.values_list('id', flat=True)), [instance.pk]
+    elif reverse and action in ('post_add', 'post_remove'):
+        event_ids, user_ids = pk_set, [instance.pk]
+    elif not reverse and action == 'pre_clear':
+        event_ids, user_ids = [instance.pk], list(instance.attenders.values_list('id', flat=True))
+    elif not reverse and action in ('post_add', 'post_remove'):
+        event_ids, user_ids = [instance.pk], pk_set
+    else:
+        return
+    bump_on_commit(*['event:%d' % pk for pk in event_ids] + ['activity:%d' % pk for pk in user_ids])
+
+
+@receiver(post_save, sender=EventReaction)
+@receiver(post_delete, sender=EventReaction)
+def reaction_changed(sender, instance, **kwargs):
+    bump_on_commit('event:%d' % instance.event_id, 'activity:%d' % instance.person_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_on_commit('event:%d' % instance.event_id)
+
+
+# Unseen notification counters. Bulk writes, which don't send signals,
+# update the counters themselves.
+
+NOTIFICATION_COUNTERS = {
+    ChatMessage: 'messages',
+    Invitation: 'invitations',
+    FriendRequest: 'friend_requests',
+}
+
+
+@receiver(post_save, sender=ChatMessage)
+@receiver(post_save, sender=Invitation)
+@receiver(post_save, sender=FriendRequest)
+def notification_created(sender, instance, created, **kwargs):
+    if created and not instance.seen:
+        NotificationCounter.objects.add([instance.receiver_id], **{NOTIFICATION_COUNTERS[sender]: 1})
+
+
+@receiver(post_delete, sender=ChatMessage)
+@receiver(post_delete, sender=Invitation)
+@receiver(post_delete, sender=FriendRequest)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.seen:
+        NotificationCounter.objects.add([instance.receiver_id], **{NOTIFICATION_COUNTERS[sender]: -1})
+
+
+# Change log for /sync/. Bulk writes, which don't send signals,
+# record their changes themselves.
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    Change.objects.record_events([instance.pk])
+
+
+@receiver(pre_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    Change.objects.record_events([instance.pk], deleted=True)
+
+
+@receiver(m2m_changed, sender=Event.attenders.through)
+def attendance_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove'):
+        return
+    deleted = action == 'post_remove'
+    if reverse:
+        Change.objects.record(Change.EVENT, pk_set, [instance.pk], deleted=deleted)
+    else:
+        Change.objects.record(Change.EVENT, [instance.pk], pk_set, deleted=deleted)
+
+
+@receiver(post_save, sender=ChatMessage)
+def message_saved(sender, instance, **kwargs):
+    Change.objects.record(Change.MESSAGE, [instance.pk], [instance.sender_id, instance.receiver_id])
+
+
+@receiver(post_delete, sender=ChatMessage)
+def message_deleted(sender, instance, **kwargs):
+    Change.objects.record(Change.MESSAGE, [instance.pk], [instance.sender_id, instance.receiver_id],
+                          deleted=True)
+
+
+@receiver(post_save, sender=Invitation)
+def invitation_saved(sender, instance, **kwargs):
+    Change.objects.record(Change.INVITATION, [instance.pk], [instance.receiver_id])
+
+
+@receiver(post_delete, sender=Invitation)
+def invitation_deleted(sender, instance, **kwargs):
+    Change.objects.record(Change.INVITATION, [instance.pk], [instance.receiver_id], deleted=True)
+
+
+@receiver(m2m_changed, sender=CustomUserData.friends.through)
+def friendship_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or reverse:
+        return
+    Change.objects.record(Change.FRIEND, pk_set, [instance.user_id], deleted=action == 'post_remove')
@@ -0,0 +1,108 @@
+import heapq
+from collections import OrderedDict
+from operator import attrgetter
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique, ever growing key (``id`` by default).
+
+    Pages are ordered newest first. ``before_id`` walks towards older objects,
+    ``after_id`` towards newer ones. Instead of one queryset a list of them can be
+    paginated, e.g. the two directions of a chat: each one is read with its own
+    index range scan and the results are merged, so a page costs the same no
+    matter how many objects there are in total.
+    """
+    key = 'id'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    limit_query_param = 'limit'
+    before_query_param = 'before_id'
+    after_query_param = 'after_id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        before = self.get_cursor(request, self.before_query_param)
+        after = self.get_cursor(request, self.after_query_param)
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+
+        if after is not None:
+            parts = [qs.filter(**{self.key + '__gt': after}).order_by(self.key)[:self.limit + 1]
+                     for qs in querysets]
+            page = self.merge(parts, reverse=False)
+            self.has_newer = len(page) > self.limit
+            self.has_older = self.exists_beyond(querysets, '__lte', after)
+            page = page[:self.limit]
+            page.reverse()
+        else:
+            parts = [qs.filter(**{self.key + '__lt': before}) if before is not None else qs
+                     for qs in querysets]
+            parts = [qs.order_by('-' + self.key)[:self.limit + 1] for qs in parts]
+            page = self.merge(parts, reverse=True)
+            self.has_older = len(page) > self.limit
+            self.has_newer = before is not None and self.exists_beyond(querysets, '__gte', before)
+            page = page[:self.limit]
+        self.page = page
+        return page
+
+    def exists_beyond(self, querysets, lookup, cursor):
+        """Whether any of the querysets has objects whose key is ``lookup`` the cursor."""
+        return any(qs.filter(**{self.key + lookup: cursor}).exists() for qs in querysets)
+
+    def merge(self, parts, reverse):
+        getter = attrgetter(self.key)
+        result = []
+        seen = set()
+        for obj in heapq.merge(*parts, key=getter, reverse=reverse):
+            key = getter(obj)
+            if key not in seen:
+                seen.add(key)
+                result.append(obj)
+                if len(result) > self.limit:
+                    break
+        return result
+
+    def get_paginated_response(self, data, count=None):
+        """``count``, the total number of objects, is included when given."""
+        response = OrderedDict() if count is None else OrderedDict([('count', count)])
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_cursor(self, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param: "A valid integer is required."})
+
+    def get_next_link(self):
+        if not self.has_older or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, self.before_query_param, getattr(self.page[-1], self.key))
+
+    def get_previous_link(self):
+        if not self.has_newer or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.before_query_param)
+        return replace_query_param(url, self.after_query_param, getattr(self.page[0], self.key))
@@ -0,0 +1,38 @@
+"""
+Pushes chat events to the websockets of connected users.
+
+Every connection joins the group of its user (see ``consumers``), and the
+channel layer configured in ``settings.CHANNEL_LAYERS`` fans the events out
+across all the worker processes.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return "user_%d" % user_id
+
+
+def push(user_ids, event, payload):
+    """
+    Sends ``event`` with ``payload`` to every socket of the given users,
+    once the current transaction (if any) commits.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    message = {'type': 'push', 'event': event, 'payload': payload}
+
+    def send():
+        for user_id in set(user_ids):
+            try:
+                async_to_sync(layer.group_send)(user_group(user_id), message)
+            except Exception:
+                logger.exception("Failed to push %s to user %d", event, user_id)
+
+    transaction.on_commit(send)
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders the same bytes as JSONRenderer, several times faster, with orjson
+    when it's installed. Datetimes, decimals and the like still go through
+    DRF's encoder. ASCII-only or non-compact output, as configured in the
+    DRF settings, indented output and anything orjson refuses to encode are
+    left to JSONRenderer.
+
+    The one difference is the notation of floats under 1e-4 or from 1e16 on,
+    e.g. ``1e16`` rather than ``1e+16``, which this API doesn't produce.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the two line terminators JavaScript doesn't allow in strings.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,117 @@
+"""
+Read replicas.
+
+Writes, and reads by default, go to the primary database. Viewsets mixing in
+``ReplicaReadMixin`` read from a replica instead, picked at random per request,
+when the request is a GET (or HEAD) and
+
+* the action isn't marked ``@read_from_primary``,
+* the user hasn't written anything in the last ``settings.REPLICA_STICKY_SECONDS``
+  seconds, so that users read their own writes despite the replication lag,
+* no transaction is open on the primary.
+
+Every request with another method counts as a write of its user, which
+``ReplicaMiddleware`` remembers in the shared cache. What gets cached beyond
+the request, cached responses and friend lists, is always read ``primary()``,
+as its cache version may already be newer than the replica. Without replicas
+configured, in ``settings.REPLICA_DATABASES``, everything stays on the primary.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+local = threading.local()
+
+
+def read_from_primary(action):
+    """Marks a viewset action whose reads must never lag behind, e.g. ones that also write."""
+    action.read_from_primary = True
+    return action
+
+
+def sticky_key(user_id):
+    return 'replicas:sticky:%d' % user_id
+
+
+def is_sticky(user_id):
+    return bool(caches[settings.REPLICA_CACHE_ALIAS].get(sticky_key(user_id)))
+
+
+def wrote(user_id):
+    """Keeps the reads of the user on the primary for a while."""
+    caches[settings.REPLICA_CACHE_ALIAS].set(sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def current_replica():
+    return getattr(local, 'replica', None)
+
+
+@contextmanager
+def primary():
+    """
+    Reads from the primary inside, for whatever outlives the request and is
+    stamped with a cache version, which a lagging replica would contradict.
+    """
+    replica = current_replica()
+    local.replica = None
+    try:
+        yield
+    finally:
+        local.replica = replica
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the very same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.REPLICA_DATABASES else None
+
+
+class ReplicaReadMixin(object):
+    """Sends the reads of safe viewset actions to a replica, see the module docstring."""
+    def initial(self, request, *args, **kwargs):
+        super(ReplicaReadMixin, self).initial(request, *args, **kwargs)
+        # Authentication has run by now, its own queries went to the primary.
+        if not settings.REPLICA_DATABASES or request.method not in SAFE_METHODS:
+            return
+        action = getattr(self, getattr(self, 'action', None) or request.method.lower(), None)
+        if getattr(action, 'read_from_primary', False):
+            return
+        if request.user.is_authenticated and is_sticky(request.user.id):
+            return
+        local.replica = random.choice(settings.REPLICA_DATABASES)
+
+
+class ReplicaMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        local.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            local.replica = None
+        # DRF hands the user it authenticated down to the Django request.
+        user = getattr(request, 'user', None)
+        if settings.REPLICA_DATABASES and request.method not in SAFE_METHODS \
+                and user is not None and user.is_authenticated:
+            wrote(user.id)
+        return response
@@ -0,0 +1,12 @@
+from channels.routing import ProtocolTypeRouter, URLRouter
+from django.conf.urls import url
+
+from social_twist.consumers import NotificationConsumer, OAuth2TokenAuthMiddleware
+
+application = ProtocolTypeRouter({
+    'websocket': OAuth2TokenAuthMiddleware(
+        URLRouter([
+            url(r'^ws/$', NotificationConsumer),
+        ])
+    ),
+})
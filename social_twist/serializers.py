@@ -1,31 +1,198 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from operator import attrgetter
+
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, RelatedField, ManyRelatedField
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, IntegerField, Manager, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 
+from social_twist.instrumentation import timed_serialization
 from social_twist.models import Event, ChatMessage,\
     Invitation, FriendRequest, CustomUserData,\
-    Comment, Image
-
+    Comment, Image, Conversation, Upload
+from social_twist.thumbnails import DEFAULT_THUMBNAIL
+
+
+class EagerLoadingMixin(object):
+    """
+    Describes which relations a serializer walks, so that views can fetch them
+    up front instead of hitting the database once per serialized object.
+
+    Nested serializer fields are discovered automatically: to-one relations are
+    joined with ``select_related`` and to-many relations are prefetched with the
+    nested serializer's own plan. ``select_related`` and ``prefetch_related``
+    list relations used by plain fields (e.g. ``source="info.picture"``), and
+    ``annotations`` are added to the queryset of the serialized model.
+    """
+    select_related = ()
+    prefetch_related = ()
+    annotations = {}
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super(EagerLoadingMixin, self).data
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        select, prefetch = cls.eager_loading_plan()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if cls.annotations:
+            queryset = queryset.annotate(**cls.annotations)
+        return queryset
+
+    @classmethod
+    def eager_loading_plan(cls, prefix=''):
+        select = [prefix + path for path in cls.select_related]
+        prefetch = [Prefetch(prefix + path) for path in cls.prefetch_related]
+        for field in cls().fields.values():
+            if field.write_only or field.source == '*':
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            child = field.child if many else field
+            if not isinstance(child, EagerLoadingMixin):
+                continue
+            path = prefix + field.source.replace('.', '__')
+            if many or child.annotations:
+                queryset = child.setup_eager_loading(child.Meta.model.objects.all())
+                prefetch.append(Prefetch(path, queryset=queryset))
+            else:
+                select.append(path)
+                nested_select, nested_prefetch = child.eager_loading_plan(path + '__')
+                select.extend(nested_select)
+                prefetch.extend(nested_prefetch)
+        return select, prefetch
+
+
+class FastListSerializer(serializers.ListSerializer):
+    """
+    ``many=True`` serializer for read paths. DRF looks up the readable fields of the
+    child, and how to get at and represent each of them, for every single object.
+    This works that out once per list and reuses it, with the same fields'
+    ``to_representation``, so the output is exactly the one of ListSerializer.
+    """
+    @property
+    def data(self):
+        with timed_serialization():
+            return super(FastListSerializer, self).data
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        represent = compile_serializer(self.child)
+        return [represent(item) for item in iterable]
+
+
+def compile_serializer(serializer):
+    """Returns a function doing what ``serializer.to_representation`` does."""
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        return serializer.to_representation
+    accessors = [(field.field_name, compile_getter(field), compile_representation(field))
+                 for field in serializer._readable_fields]
+
+    def represent(instance):
+        ret = OrderedDict()
+        for name, get, to_representation in accessors:
+            try:
+                attribute = get(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[name] = None if check_for_none is None else to_representation(attribute)
+        return ret
+    return represent
+
+
+def compile_getter(field):
+    if field.source == '*':
+        return lambda instance: instance
+    if isinstance(field, (RelatedField, ManyRelatedField)):
+        return field.get_attribute
+    getter = attrgetter('.'.join(field.source_attrs))
+
+    def get(instance):
+        # Dictionaries, callables and missing attributes are left to DRF.
+        if isinstance(instance, Mapping):
+            return field.get_attribute(instance)
+        try:
+            value = getter(instance)
+        except (AttributeError, ObjectDoesNotExist):
+            return field.get_attribute(instance)
+        if callable(value):
+            return field.get_attribute(instance)
+        return value
+    return get
+
+
+def compile_representation(field):
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    if isinstance(field, serializers.ListSerializer):
+        represent_child = compile_serializer(field.child)
+        return lambda value: [represent_child(item)
+                              for item in (value.all() if isinstance(value, Manager) else value)]
+    if isinstance(field, serializers.Serializer):
+        return compile_serializer(field)
+    return field.to_representation
+
+
+class ImageSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    thumbnail = serializers.SerializerMethodField()
 
-class ImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Image
-        fields = ('id', 'image', 'thumbnail')
+        fields = ('id', 'image', 'thumbnail', 'thumbnails')
+
+    def get_thumbnail(self, obj):
+        return obj.thumbnails.get(DEFAULT_THUMBNAIL)
 
 
-class PersonSerializer(serializers.HyperlinkedModelSerializer):
+class PersonSerializer(EagerLoadingMixin, serializers.HyperlinkedModelSerializer):
     picture = serializers.ImageField(source="info.picture")
     sex = serializers.CharField(source="info.sex", max_length=2, allow_blank=True)
     birthday = serializers.DateField(source="info.birthday", required=False)
     thumbnail = serializers.SerializerMethodField()
+    thumbnails = serializers.JSONField(source="info.thumbnails", read_only=True)
+
+    select_related = ('info',)
+
+    class Meta:
+        model = User
+        fields = ('id', 'first_name', 'last_name', 'picture', 'sex', 'birthday', 'thumbnail',
+                  'thumbnails')
+
+    def get_thumbnail(self, obj):
+        if obj.info.picture:
+            return obj.info.thumbnails.get(DEFAULT_THUMBNAIL)
+        return None
+
+
+class SlimPersonSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Just enough of a person for long lists. ``is_friend``, whether the current
+    user is friends with them, is only there when the queryset annotates it.
+    """
+    thumbnail = serializers.SerializerMethodField()
+    is_friend = serializers.BooleanField(read_only=True)
+
+    select_related = ('info',)
 
     class Meta:
         model = User
-        fields = ('id', 'first_name', 'last_name', 'picture', 'sex', 'birthday', 'thumbnail')
+        list_serializer_class = FastListSerializer
+        fields = ('id', 'first_name', 'last_name', 'thumbnail', 'is_friend')
 
     def get_thumbnail(self, obj):
         if obj.info.picture:
-            return obj.info.thumbnail.url
+            return obj.info.thumbnails.get(DEFAULT_THUMBNAIL)
         return None
 
 
@@ -36,7 +203,7 @@ class PersonWithFriendsSerializer(PersonSerializer):
     class Meta:
         model = User
         fields = ('id', 'first_name', 'last_name',
-                  'picture', 'sex', 'birthday', 'thumbnail',
+                  'picture', 'sex', 'birthday', 'thumbnail', 'thumbnails',
                   'friends', 'images')
 
 
@@ -46,13 +213,14 @@ class FriendSerializer(PersonWithFriendsSerializer):
 
     class Meta:
         model = User
+        list_serializer_class = FastListSerializer
         fields = ('id', 'first_name', 'last_name',
                   'location', 'picture', 'phone_number',
-                  'sex', 'birthday', 'thumbnail',
+                  'sex', 'birthday', 'thumbnail', 'thumbnails',
                   'friends', 'images')
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSerializer(EagerLoadingMixin, serializers.HyperlinkedModelSerializer):
     location = serializers.CharField(source="info.location", max_length=1024, allow_blank=True)
     picture = serializers.ImageField(source="info.picture", required=False)
     phone_number = serializers.CharField(source="info.phone_number",
@@ -68,11 +236,14 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
     sex = serializers.CharField(source="info.sex", max_length=2, required=False)
     birthday = serializers.DateField(source="info.birthday", required=False)
     thumbnail = serializers.SerializerMethodField()
+    thumbnails = serializers.JSONField(source="info.thumbnails", read_only=True)
     images = ImageSerializer(many=True, read_only=True)
 
+    select_related = ('info',)
+
     class Meta:
         model = User
-        fields = ('id', 'first_name', 'last_name', 'location', 'thumbnail',
+        fields = ('id', 'first_name', 'last_name', 'location', 'thumbnail', 'thumbnails',
                   'picture', 'phone_number', 'is_ios', 'device_token',
                   'friends', 'password', 'email', 'username', 'sex',
                   'birthday', 'images')
@@ -99,48 +270,101 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
 
     def get_thumbnail(self, obj):
         if obj.info.picture:
-            return obj.info.thumbnail.url
+            return obj.info.thumbnails.get(DEFAULT_THUMBNAIL)
         return None
 
 
-class EventSerializer(serializers.HyperlinkedModelSerializer):
+def attenders_count():
+    """
+    Number of attenders of every event, as a correlated subquery: a plain
+    ``Count('attenders')`` would reuse the join of querysets like ``user.events``,
+    which only has the rows of that user.
+    """
+    counts = Event.attenders.through.objects.filter(event_id=OuterRef('pk')).order_by()\
+        .values('event_id').annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class EventSerializer(EagerLoadingMixin, serializers.HyperlinkedModelSerializer):
     creator = PersonWithFriendsSerializer(read_only=True, default=serializers.CurrentUserDefault())
     description = serializers.CharField(required=False)
     picture = serializers.ImageField(required=False)
     attenders = serializers.SerializerMethodField()
     thumbnail = serializers.SerializerMethodField()
+    distance = serializers.SerializerMethodField()
+    video = serializers.SerializerMethodField()
+
+    annotations = {'attenders_count': attenders_count()}
 
     class Meta:
         model = Event
+        list_serializer_class = FastListSerializer
         fields = ('id', 'title', 'description', 'creator', 'picture', 'attenders',
                   'start_time', 'coordinates', 'location', 'type', 'is_private',
-                  'video', 'likes', 'dislikes', 'thumbnail')
+                  'video', 'likes', 'dislikes', 'thumbnail', 'thumbnails', 'distance')
 
     def get_attenders(self, obj):
+        if hasattr(obj, 'attenders_count'):
+            return obj.attenders_count
         return obj.attenders.count()
 
     def get_thumbnail(self, obj):
         if obj.picture:
-            return obj.thumbnail.url
+            return obj.thumbnails.get(DEFAULT_THUMBNAIL)
         return None
 
+    def get_video(self, obj):
+        """The route checking who may watch it, the file itself isn't public."""
+        if not obj.video:
+            return None
+        return reverse('events-video', kwargs={'pk': obj.pk}, request=self.context.get('request'))
+
+    def get_distance(self, obj):
+        """Distance in km from the searched point, if there was one."""
+        if getattr(obj, 'distance', None) is None:
+            return None
+        return round(obj.distance.km, 3)
+
 
-class MessageSerializer(serializers.HyperlinkedModelSerializer):
+class MessageSerializer(EagerLoadingMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = ChatMessage
+        list_serializer_class = FastListSerializer
         fields = ('id', 'sender_id', 'receiver_id', 'text', 'timestamp', 'seen')
 
 
-class InvitationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Latest message of a conversation, along with the companion.
+    """
+    id = serializers.IntegerField(source="last_message.id")
+    sender_id = serializers.IntegerField(source="last_message.sender_id")
+    receiver_id = serializers.IntegerField(source="last_message.receiver_id")
+    text = serializers.CharField(source="last_message.text")
+    timestamp = serializers.DateTimeField(source="last_message.timestamp")
+    seen = serializers.BooleanField(source="last_message.seen")
+    companion = PersonWithFriendsSerializer()
+
+    select_related = ('last_message',)
+
+    class Meta:
+        model = Conversation
+        list_serializer_class = FastListSerializer
+        fields = ('id', 'sender_id', 'receiver_id', 'text', 'timestamp', 'seen',
+                  'companion', 'unread_count')
+
+
+class InvitationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     sender = PersonWithFriendsSerializer()
     event = EventSerializer()
 
     class Meta:
         model = Invitation
+        list_serializer_class = FastListSerializer
         fields = ('id', 'sender', 'receiver_id', 'event', 'timestamp', 'seen')
 
 
-class FriendRequestSerializer(serializers.ModelSerializer):
+class FriendRequestSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     sender = PersonWithFriendsSerializer()
 
     class Meta:
@@ -148,7 +372,7 @@ class FriendRequestSerializer(serializers.ModelSerializer):
         fields = ('id', 'sender', 'receiver_id', 'timestamp', 'seen')
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     author = PersonWithFriendsSerializer(required=False)
     author_id = serializers.IntegerField(write_only=True)
     event_id = serializers.IntegerField(write_only=True)
@@ -156,3 +380,20 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('id', 'author', 'author_id', 'text', 'timestamp', 'event_id')
+
+
+class SlimCommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    author = SlimPersonSerializer()
+    author_is_friend = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Comment
+        list_serializer_class = FastListSerializer
+        fields = ('id', 'author', 'author_is_friend', 'text', 'timestamp')
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ('id', 'filename', 'size', 'offset')
+        read_only_fields = ('offset',)
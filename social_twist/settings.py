@@ -40,16 +40,20 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'rest_framework',
     'oauth2_provider',
     'social_twist',
     'rest_framework_swagger',
     'imagekit',
+    'channels',
 ]
 
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'social_twist.instrumentation.InstrumentationMiddleware',
+    'social_twist.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,19 +83,94 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'social_twist.wsgi.application'
+ASGI_APPLICATION = 'social_twist.routing.application'
+
+# Websocket fan-out between worker processes goes through Redis when it's configured,
+# otherwise the in-memory layer is used, which only reaches sockets of the same process.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
+#
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse, see
+# social_twist/db/backends/postgis/base.py. With DB_POOL_SIZE, the threads of a process
+# share a pool of that many connections instead, see social_twist/db/pool.py.
+# DB_STATEMENT_TIMEOUT, in milliseconds, cancels runaway queries; 0 leaves them be.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.contrib.gis.db.backends.postgis',
+        'ENGINE': 'social_twist.db.backends.postgis',
         'NAME': 'twist',
         'USER': 'twist',
         'HOST': 'db',
-        'PORT': 5432
+        'PORT': 5432,
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'HEALTH_CHECKS': True,
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'IDLE_TIMEOUT': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
+        'OPTIONS': {
+            'options': '-c statement_timeout=%d' % int(os.environ.get('DB_STATEMENT_TIMEOUT', 0)),
+        },
     }
 }
+
+# Read replicas of the primary, as comma separated host[:port] in DATABASE_REPLICAS.
+# Safe requests read from them, unless their user has just written something,
+# see social_twist/replicas.py.
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(','))):
+    host, _, port = replica.strip().partition(':')
+    alias = 'replica_%d' % index
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host, PORT=int(port or DATABASES['default']['PORT']),
+                            TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['social_twist.replicas.ReplicaRouter']
+REPLICA_CACHE_ALIAS = 'default'
+REPLICA_STICKY_SECONDS = 10
+
+# Caches, Redis is shared by all the processes when it's configured.
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        },
+    }
+
+# Cached responses of read-only endpoints, see social_twist/caching.py.
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+# How far apart the clocks of the processes bumping versions may be, in seconds.
+RESPONSE_CACHE_CLOCK_SKEW = 1
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -134,17 +213,27 @@ STATIC_ROOT = '/static/'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
+        'social_twist.authentication.CachedOAuth2Authentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'social_twist.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10
 }
 
+# Cached access token lookups, see social_twist/authentication.py.
+# Revoked tokens keep working for up to AUTH_TOKEN_LOCAL_TTL seconds in other processes.
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 60
+AUTH_TOKEN_LOCAL_TTL = 30
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+
 OAUTH2_PROVIDER = {
     'ACCESS_TOKEN_EXPIRE_SECONDS': 604800,
     'OAUTH2_BACKEND_CLASS': 'oauth2_provider.oauth2_backends.JSONOAuthLibCore'
@@ -152,3 +241,42 @@ OAUTH2_PROVIDER = {
 
 MEDIA_ROOT = "/media/"
 MEDIA_URL = "http://%s/media/" % ALLOWED_HOSTS[0]
+
+# Chunked uploads, see social_twist/views/uploads.py. Partial files are kept
+# inside MEDIA_ROOT, so that completed ones are moved into place without a copy.
+UPLOAD_PARTIAL_DIR = os.path.join(MEDIA_ROOT, "uploads", "partial")
+UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Internal nginx location serving MEDIA_ROOT, for X-Accel-Redirect.
+PROTECTED_MEDIA_URL = "/protected/media/"
+
+# Background jobs, see social_twist/jobs.py.
+# Use social_twist.jobs.InProcessExecutor to run them right away, without a worker.
+JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'social_twist.jobs.DatabaseExecutor')
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+
+# Users whose friends are cached in every process, see social_twist/friends.py.
+FRIEND_GRAPH_CACHE_SIZE = 100000
+
+# New events of people with more friends than this aren't copied into
+# their feeds, the feeds read them from the event table instead.
+FEED_FANOUT_MAX_FRIENDS = 5000
+
+# Request metrics, see social_twist/instrumentation.py. /metrics/ is only served
+# with a token, SERVER_TIMING adds the timings of every request to its response.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_CACHE_ALIAS = 'default'
+METRICS_FLUSH_INTERVAL = 10
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1' if DEBUG else '0') == '1'
+
+# Incremental sync, see social_twist/views/sync.py. Older changes get compacted
+# away by ./manage.py compact_changes, so older tokens make the client start over.
+SYNC_RETENTION_DAYS = 30
+SYNC_BATCH_SIZE = 500
+
+# The most operations a single /batch/ request may carry, see social_twist/views/batch.py.
+BATCH_MAX_OPERATIONS = 200
+
+APNS_CERT_FILE = os.environ.get('APNS_CERT_FILE')
+APNS_TOPIC = os.environ.get('APNS_TOPIC', 'com.social-twist')
+APNS_USE_SANDBOX = os.environ.get('APNS_USE_SANDBOX') == '1'
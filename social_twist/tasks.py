@@ -0,0 +1,103 @@
+"""
+Background jobs, enqueued through ``social_twist.jobs``.
+"""
+import logging
+import random
+import string
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.conf import settings
+from django.db.models.signals import post_save
+
+from social_twist.caching import bump
+from social_twist.jobs import job, enqueue
+from social_twist.models import Change, CustomUserData, Event, Image
+from social_twist.thumbnails import render_thumbnails
+
+try:
+    from apns2.client import APNsClient
+    from apns2.payload import Payload
+except ImportError:
+    APNsClient = Payload = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SOURCES = {
+    'user': (CustomUserData, 'picture'),
+    'event': (Event, 'picture'),
+    'image': (Image, 'image'),
+}
+
+
+@job()
+def send_mail(subject, message, from_email, recipients):
+    mail.send_mail(subject, message, from_email, recipients, fail_silently=False)
+
+
+def generate_password(length=8):
+    rng = random.SystemRandom()
+    choices = string.digits + string.ascii_lowercase + string.ascii_uppercase
+    return ''.join([rng.choice(choices) for _ in range(length)])
+
+
+@job()
+def reset_password(user_id):
+    """Gives the user a new password and mails it to them."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    password = generate_password()
+    user.set_password(password)
+    user.save(update_fields=['password'])
+    mail.send_mail('Your new social twist password',
+                   'Here is your new social twist password: %s\n'
+                   'Please reset it at the first convenient moment.' % password,
+                   'staff@social_twist.com', [user.email], fail_silently=False)
+
+
+@job()
+def push_notification(user_id, alert, data=None):
+    """Sends a push notification to the iOS device of the user, if there's one."""
+    info = CustomUserData.objects.filter(user_id=user_id).first()
+    if info is None or not info.is_ios or not info.device_token:
+        return
+    if APNsClient is None or not settings.APNS_CERT_FILE:
+        logger.warning("APNs isn't configured, dropping push to user %d.", user_id)
+        return
+    client = APNsClient(settings.APNS_CERT_FILE, use_sandbox=settings.APNS_USE_SANDBOX)
+    client.send_notification(info.device_token,
+                             Payload(alert=alert, sound="default", custom=data or {}),
+                             topic=settings.APNS_TOPIC)
+
+
+@job()
+def generate_thumbnails(model, pk):
+    """Renders the thumbnails of a picture and stores their URLs on the model."""
+    model_class, field = THUMBNAIL_SOURCES[model]
+    instance = model_class.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return
+    urls = render_thumbnails(getattr(instance, field))
+    model_class.objects.filter(pk=pk).update(thumbnails=urls)
+    if model == 'event':
+        Change.objects.record_events([pk])
+        bump('event:%d' % pk)
+    else:
+        bump('person:%d' % (instance.owner_id if model == 'image' else instance.user_id))
+
+
+def thumbnail_receiver(model):
+    field = THUMBNAIL_SOURCES[model][1]
+
+    def enqueue_thumbnails(sender, instance, **kwargs):
+        picture = getattr(instance, field)
+        if picture:
+            enqueue('generate_thumbnails', {'model': model, 'pk': instance.pk},
+                    key="thumbnail:%s:%d:%s" % (model, instance.pk, picture.name))
+    return enqueue_thumbnails
+
+
+for _model, (_model_class, _) in THUMBNAIL_SOURCES.items():
+    post_save.connect(thumbnail_receiver(_model), sender=_model_class, weak=False,
+                      dispatch_uid="thumbnails_%s" % _model)
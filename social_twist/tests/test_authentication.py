@@ -0,0 +1,67 @@
+import datetime
+import time
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+
+from social_twist.authentication import AccessToken, TokenCache, authenticate_token, tokens
+from social_twist.tests.utils import make_user
+
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        caches[settings.AUTH_TOKEN_CACHE_ALIAS].clear()
+        with tokens.lock:
+            tokens.entries.clear()
+        self.user = make_user()
+
+    def issue(self, expires_in=3600):
+        return AccessToken.objects.create(user=self.user, token=uuid.uuid4().hex, scope='read write',
+                                          expires=timezone.now() + datetime.timedelta(seconds=expires_in))
+
+    def assertAuthenticates(self, token):
+        authenticated = authenticate_token(token.token)
+        self.assertIsNotNone(authenticated)
+        self.assertEqual(authenticated[0], self.user)
+
+    def test_revoked_token_stops_authenticating(self):
+        token = self.issue()
+        self.assertAuthenticates(token)
+        token.delete()
+        self.assertIsNone(authenticate_token(token.token))
+
+    def test_token_expired_since_it_got_cached_is_rejected(self):
+        token = self.issue()
+        self.assertAuthenticates(token)
+        token.expires = timezone.now() - datetime.timedelta(seconds=1)
+        token.save()
+        self.assertIsNone(authenticate_token(token.token))
+
+    def test_cached_token_past_its_expiry_is_rejected(self):
+        token = self.issue(expires_in=60)
+        self.assertAuthenticates(token)
+        later = time.time() + 120
+        with mock.patch('social_twist.authentication.time.time', return_value=later):
+            self.assertIsNone(authenticate_token(token.token))
+
+    def test_inactive_user_is_rejected(self):
+        token = self.issue()
+        self.assertAuthenticates(token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate_token(token.token))
+
+    def test_unknown_token_is_rejected(self):
+        self.assertIsNone(authenticate_token('nope'))
+
+    def test_lru_keeps_at_most_max_entries(self):
+        cache = TokenCache(max_entries=2)
+        issued = [self.issue() for _ in range(3)]
+        for token in issued:
+            self.assertIsNotNone(cache.get(token.token))
+        cache.get(issued[1].token)
+        self.assertEqual(list(cache.entries), [cache.key(issued[2].token), cache.key(issued[1].token)])
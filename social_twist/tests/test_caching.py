@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from social_twist.caching import bump, cached_response, get_cache, get_versions, version_key
+from social_twist.tests.utils import make_user, call
+
+
+class CountingView(viewsets.ViewSet):
+    calls = 0
+
+    @cached_response('thing:{pk}')
+    def retrieve(self, request, pk=None):
+        CountingView.calls += 1
+        return Response({'id': int(pk), 'calls': CountingView.calls})
+
+
+class CachedResponseTest(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = make_user()
+        self.view = CountingView.as_view({'get': 'retrieve'})
+
+    def get(self, **headers):
+        return call(self.view, self.user, headers=headers, pk=1)
+
+    def test_caches_responses_on_resources_never_bumped(self):
+        first = self.get()
+        self.assertEqual(self.get().data, first.data)
+
+    def test_bump_invalidates(self):
+        first = self.get()
+        bump('thing:1')
+        self.assertNotEqual(self.get().data, first.data)
+
+    def test_if_none_match(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other", W/%s' % etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        # Not a substring match.
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag[:-3] + '"').status_code, 200)
+
+
+class GetVersionsTest(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def test_seeds_missing_versions_in_one_batch(self):
+        bump('a')
+        cache = get_cache()
+        with mock.patch.object(cache, 'add') as add, mock.patch.object(cache, 'get') as get:
+            versions = get_versions(['a', 'b', 'c'], seed=1)
+        add.assert_not_called()
+        get.assert_not_called()
+        self.assertEqual(versions[1:], [1, 1])
+        self.assertGreater(versions[0], 1)
+        self.assertEqual(cache.get(version_key('b')), 1)
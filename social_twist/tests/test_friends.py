@@ -0,0 +1,33 @@
+from django.test import TestCase
+
+from social_twist.friends import graph
+from social_twist.models import Friendship
+from social_twist.tests.utils import make_user, call
+from social_twist.views.user import UserView
+
+
+class MutualFriendsTest(TestCase):
+    def setUp(self):
+        # Ids get reused once a test rolls back.
+        graph.clear()
+        self.addCleanup(graph.clear)
+        self.user = make_user()
+        self.friend = make_user('friend')
+        self.stranger = make_user('stranger')
+        Friendship.objects.befriend(self.user, self.friend)
+        for _ in range(2):
+            common = make_user('common')
+            Friendship.objects.befriend(self.user, common)
+            Friendship.objects.befriend(self.stranger, common)
+        Friendship.objects.befriend(self.friend, common)
+
+    def test_retrieve_tells_friends_and_mutual_friends(self):
+        view = UserView.as_view({'get': 'retrieve'})
+        friend = call(view, self.user, pk=self.friend.pk).data
+        stranger = call(view, self.user, pk=self.stranger.pk).data
+        self.assertEqual((friend['is_friend'], friend['mutual_friends']), (True, 1))
+        self.assertEqual((stranger['is_friend'], stranger['mutual_friends']), (False, 2))
+
+    def test_search_counts_mutual_friends(self):
+        response = call(UserView.as_view({'get': 'search'}), self.user, path='/?name=stranger')
+        self.assertEqual([person['mutual_friends'] for person in response.data['results']], [2])
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+
+from social_twist.jobs import InProcessExecutor, enqueue, job, work
+from social_twist.models import Job
+
+calls = []
+
+
+@job('test_record')
+def record(value):
+    calls.append(value)
+
+
+@job('test_fail', max_attempts=3)
+def fail(value):
+    calls.append(value)
+    raise ValueError("Failing on purpose.")
+
+
+class JobTestMixin(object):
+    def setUp(self):
+        del calls[:]
+        InProcessExecutor.forget_keys()
+
+
+@override_settings(JOB_EXECUTOR='social_twist.jobs.InProcessExecutor')
+class InProcessExecutorTest(JobTestMixin, TransactionTestCase):
+    """Outside of a transaction, the in-process executor runs jobs right away."""
+    def test_runs_jobs(self):
+        enqueue('test_record', {'value': 1})
+        enqueue('test_record', {'value': 2})
+        self.assertEqual(calls, [1, 2])
+
+    def test_runs_a_job_once_per_idempotency_key(self):
+        enqueue('test_record', {'value': 1}, key='record:1')
+        enqueue('test_record', {'value': 1}, key='record:1')
+        enqueue('test_record', {'value': 2}, key='record:2')
+        self.assertEqual(calls, [1, 2])
+
+    def test_forgets_the_oldest_keys(self):
+        with mock.patch.object(InProcessExecutor, 'max_keys', 2):
+            for key in ('a', 'b', 'c', 'a'):
+                enqueue('test_record', {'value': key}, key=key)
+        self.assertEqual(calls, ['a', 'b', 'c', 'a'])
+        self.assertEqual(list(InProcessExecutor.keys), ['c', 'a'])
+
+
+@override_settings(JOB_EXECUTOR='social_twist.jobs.DatabaseExecutor', JOB_RETRY_DELAY=0)
+class QueueTest(JobTestMixin, TransactionTestCase):
+    """Runs the database queue in this process, as ``./manage.py run_jobs --once`` would."""
+    def test_enqueues_a_job_once_per_idempotency_key(self):
+        first = enqueue('test_record', {'value': 1}, key='record:1')
+        second = enqueue('test_record', {'value': 1}, key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        work(once=True)
+        self.assertEqual(calls, [1])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.payload), (Job.DONE, 1, {}))
+
+    def test_retries_a_failing_job_up_to_max_attempts(self):
+        job_obj = enqueue('test_fail', {'value': 1})
+        work(once=True)
+        self.assertEqual(calls, [1, 1, 1])
+        job_obj.refresh_from_db()
+        self.assertEqual((job_obj.status, job_obj.attempts), (Job.FAILED, 3))
+        self.assertIn("Failing on purpose.", job_obj.last_error)
+
+    def test_fails_a_job_with_an_unknown_name(self):
+        job_obj = Job.objects.create(name='test_missing', payload={}, max_attempts=5)
+        enqueue('test_record', {'value': 1})
+        work(once=True)
+        self.assertEqual(calls, [1])
+        job_obj.refresh_from_db()
+        self.assertEqual((job_obj.status, job_obj.attempts), (Job.FAILED, 1))
+        self.assertIn("KeyError", job_obj.last_error)
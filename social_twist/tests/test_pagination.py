@@ -0,0 +1,44 @@
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from social_twist.models import Event
+from social_twist.pagination import KeysetPagination
+from social_twist.tests.utils import make_user, make_event
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        creator = make_user()
+        self.ids = [make_event(creator).id for _ in range(5)]
+
+    def paginate(self, **params):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/events/', dict(params, limit=2)))
+        page = paginator.paginate_queryset(Event.objects.all(), request)
+        response = paginator.get_paginated_response([event.id for event in page])
+        return response.data
+
+    def test_first_page(self):
+        data = self.paginate()
+        self.assertEqual(data['results'], self.ids[:-3:-1])
+        self.assertIsNotNone(data['next'])
+        self.assertIsNone(data['previous'])
+
+    def test_newer_page_in_the_middle(self):
+        data = self.paginate(after_id=self.ids[1])
+        self.assertEqual(data['results'], [self.ids[3], self.ids[2]])
+        self.assertIsNotNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+    def test_no_older_link_when_nothing_is_older(self):
+        data = self.paginate(after_id=self.ids[0] - 1)
+        self.assertEqual(data['results'], [self.ids[1], self.ids[0]])
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+    def test_no_newer_link_when_nothing_is_newer(self):
+        data = self.paginate(before_id=self.ids[-1] + 1)
+        self.assertEqual(data['results'], self.ids[:-3:-1])
+        self.assertIsNotNone(data['next'])
+        self.assertIsNone(data['previous'])
@@ -0,0 +1,74 @@
+import copy
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from social_twist.db import pool as pool_module
+from social_twist.db.backends.postgis.base import DatabaseWrapper
+from social_twist.db.pool import ConnectionPool
+
+
+class FakeConnection(object):
+    closed = False
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(2, health_checks=False)
+
+    def test_hands_an_idle_connection_out_again(self):
+        connection = self.pool.acquire(FakeConnection, 'twist')
+        self.pool.release(connection, 'twist')
+        self.assertIs(self.pool.acquire(FakeConnection, 'twist'), connection)
+
+    def test_never_hands_out_a_connection_made_with_other_params(self):
+        connection = self.pool.acquire(FakeConnection, 'twist')
+        self.pool.release(connection, 'twist')
+        other = self.pool.acquire(FakeConnection, 'test_twist')
+        self.assertIsNot(other, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(len(self.pool.idle), 0)
+
+    def test_counts_connections_in_use(self):
+        handed_out = [self.pool.acquire(FakeConnection) for _ in range(2)]
+        self.pool.timeout = 0
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(FakeConnection)
+        self.pool.release(handed_out[0])
+        self.assertIs(self.pool.acquire(FakeConnection), handed_out[0])
+
+
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    """What the test runner does: close the connection, then switch the database it's for."""
+    allow_database_queries = True
+    alias = 'pool_test'
+
+    def setUp(self):
+        settings_dict = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+        settings_dict['POOL'] = {'SIZE': 1}
+        self.wrapper = DatabaseWrapper(settings_dict, self.alias)
+        self.addCleanup(pool_module.pools.pop, self.alias)
+        self.addCleanup(self.wrapper.pool.close)
+        self.addCleanup(self.wrapper.close)
+
+    def current_database(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT current_database()')
+            return cursor.fetchone()[0]
+
+    def test_switching_databases_doesnt_reuse_the_old_connection(self):
+        self.assertEqual(self.current_database(), self.wrapper.settings_dict['NAME'])
+        self.wrapper.close()
+        self.wrapper.settings_dict['NAME'] = 'postgres'
+        self.assertEqual(self.current_database(), 'postgres')
@@ -0,0 +1,46 @@
+import random
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from social_twist.models import Event, EventReaction
+from social_twist.tests.utils import make_user, make_event
+
+
+class ConcurrentReactionsTest(TransactionTestCase):
+    """Many people liking and disliking the same events at once leave exact counters."""
+    threads = 8
+    rounds = 25
+
+    def setUp(self):
+        self.people = [make_user('person') for _ in range(self.threads)]
+        creator = make_user('creator')
+        self.events = [make_event(creator) for _ in range(3)]
+
+    def react(self, person, seed, errors):
+        rng = random.Random(seed)
+        try:
+            for _ in range(self.rounds):
+                EventReaction.objects.react(person, rng.choice(self.events).id, liked=rng.random() < 0.5)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_counters_match_the_reactions(self):
+        errors = []
+        # Two threads per person, so that the same reaction is also fought over.
+        threads = [threading.Thread(target=self.react, args=(person, seed, errors))
+                   for seed, person in enumerate(self.people * 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        for event in Event.objects.filter(id__in=[event.id for event in self.events]):
+            reactions = EventReaction.objects.filter(event=event)
+            self.assertEqual(event.likes, reactions.filter(liked=True).count())
+            self.assertEqual(event.dislikes, reactions.filter(disliked=True).count())
+            self.assertEqual(reactions.filter(liked=True, disliked=True).count(), 0)
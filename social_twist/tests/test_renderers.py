@@ -0,0 +1,62 @@
+import datetime
+import decimal
+
+from django.contrib.gis.measure import Distance
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+from social_twist.models import Event, Friendship, Image
+from social_twist.renderers import FastJSONRenderer
+from social_twist.serializers import EventSerializer, FriendSerializer
+from social_twist.tests.utils import make_user, make_event
+
+LINE_TERMINATORS = "line\u2028paragraph\u2029end"
+
+
+class FastPathTest(TestCase):
+    """FastListSerializer and FastJSONRenderer render the very bytes DRF does."""
+    def setUp(self):
+        self.creator = make_user(LINE_TERMINATORS)
+        self.creator.info.picture = 'pictures/creator.jpg'
+        self.creator.info.thumbnails = {'small': '/media/thumbnails/creator.jpg'}
+        self.creator.info.save()
+        for index in range(2):
+            friend = make_user('friend %d' % index)
+            Friendship.objects.befriend(self.creator, friend)
+        Image.objects.create(owner=self.creator, image='images/one.jpg')
+        make_event(self.creator, title=LINE_TERMINATORS, description="ünïcödé   \"quoted\"",
+                   start_time=timezone.now().replace(microsecond=123456))
+        make_event(self.creator, title="with a picture", picture='events/picture.jpg',
+                   start_time=datetime.datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                   thumbnails={'small': '/media/thumbnails/event.jpg'})
+        make_event(self.creator, title="private", is_private=True, likes=3, dislikes=1)
+
+    def assertSameBytes(self, serializer_class, objects):
+        drf = JSONRenderer().render(ListSerializer(objects, child=serializer_class()).data)
+        fast = FastJSONRenderer().render(serializer_class(objects, many=True).data)
+        self.assertEqual(fast, drf)
+
+    def test_events(self):
+        events = list(EventSerializer.setup_eager_loading(Event.objects.order_by('id')))
+        for event, km in zip(events, (1.23456789, 0.1, None)):
+            event.distance = None if km is None else Distance(km=km)
+        self.assertSameBytes(EventSerializer, events)
+
+    def test_friends(self):
+        friends = list(FriendSerializer.setup_eager_loading(self.creator.info.friends.order_by('id')))
+        self.assertSameBytes(FriendSerializer, friends + [self.creator])
+
+    def test_renderer(self):
+        data = [{
+            'when': timezone.now(),
+            'day': datetime.date(2030, 1, 2),
+            'floats': [0.1, 1.5, 52.520008, 13.404954, -180.0, 123456789.125],
+            'decimal': decimal.Decimal('1.10'),
+            'text': LINE_TERMINATORS + " \"quotes\" \\ / ünïcödé \U0001F600",
+            'nothing': None,
+            'flags': [True, False],
+            'nested': {'empty': {}, 'list': []},
+        }]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
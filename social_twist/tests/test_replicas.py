@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from social_twist import replicas
+from social_twist.tests.utils import make_user, call
+from social_twist.views.user import FriendView, UserView
+
+REPLICA = 'replica_test'
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Routes reads between the test database and a second alias mirroring it,
+    the way settings.py configures replicas. Both connections see the same
+    committed rows, hence a TransactionTestCase.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super(ReplicaRoutingTest, cls).setUpClass()
+        connections.databases[REPLICA] = dict(connections[DEFAULT_DB_ALIAS].settings_dict,
+                                              TEST={'MIRROR': DEFAULT_DB_ALIAS})
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        super(ReplicaRoutingTest, cls).tearDownClass()
+
+    def setUp(self):
+        replicas.local.replica = None
+        self.user = make_user()
+        self.person = make_user('person')
+
+    def tearDown(self):
+        replicas.local.replica = None
+
+    def assertReadFrom(self, alias, func):
+        other = REPLICA if alias == DEFAULT_DB_ALIAS else DEFAULT_DB_ALIAS
+        with CaptureQueriesContext(connections[alias]) as used, \
+                CaptureQueriesContext(connections[other]) as unused:
+            response = func()
+        self.assertTrue(used.captured_queries)
+        self.assertEqual(unused.captured_queries, [])
+        return response
+
+    def retrieve(self):
+        return call(UserView.as_view({'get': 'retrieve'}), self.user, pk=self.person.pk)
+
+    def test_safe_get_reads_from_a_replica(self):
+        response = self.assertReadFrom(REPLICA, self.retrieve)
+        self.assertEqual(response.status_code, 200)
+
+    def test_write_stays_on_the_primary(self):
+        response = self.assertReadFrom(DEFAULT_DB_ALIAS, lambda: call(
+            UserView.as_view({'post': 'add_friend'}), self.user, method='post', pk=self.person.pk))
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_who_just_wrote_reads_from_the_primary(self):
+        replicas.wrote(self.user.id)
+        response = self.assertReadFrom(DEFAULT_DB_ALIAS, self.retrieve)
+        self.assertEqual(response.status_code, 200)
+
+    def test_action_marked_read_from_primary_reads_from_the_primary(self):
+        response = self.assertReadFrom(DEFAULT_DB_ALIAS,
+                                        lambda: call(FriendView.as_view({'get': 'requests'}), self.user))
+        self.assertEqual(response.status_code, 200)
+
+    def test_reads_in_an_atomic_block_stay_on_the_primary(self):
+        with transaction.atomic():
+            response = self.assertReadFrom(DEFAULT_DB_ALIAS, self.retrieve)
+        self.assertEqual(response.status_code, 200)
+
+    def test_primary_overrides_the_replica_of_the_request(self):
+        replicas.local.replica = REPLICA
+        self.assertEqual(router.db_for_read(User), REPLICA)
+        with replicas.primary():
+            self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(User), REPLICA)
+        self.assertEqual(router.db_for_write(User), DEFAULT_DB_ALIAS)
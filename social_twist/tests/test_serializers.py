@@ -0,0 +1,64 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from social_twist.instrumentation import enforce_query_budgets
+from social_twist.models import Friendship, Image
+from social_twist.tests.utils import make_user, make_event, call
+from social_twist.views.user import ProfileView, UserView
+
+
+class AttendersCountTest(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.event = make_event(make_user('creator'))
+        self.event.attenders.add(self.user, *[make_user('guest') for _ in range(3)])
+
+    def test_own_attended_events_count_every_attender(self):
+        response = call(ProfileView.as_view({'get': 'attends'}), self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['attenders'] for event in response.data], [4])
+
+    def test_attended_events_of_a_user_count_every_attender(self):
+        response = call(UserView.as_view({'get': 'attends'}), make_user('viewer'), pk=self.user.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['attenders'] for event in response.data], [4])
+
+
+class EventPageQueriesTest(TestCase):
+    """A page of events costs the same queries, whatever the events, creators and friends on it."""
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def populate(self, events, friends, images):
+        for _ in range(events):
+            creator = make_user('creator')
+            Friendship.objects.befriend(self.user, creator)
+            for _ in range(friends):
+                Friendship.objects.befriend(creator, make_user('friend'))
+            for index in range(images):
+                Image.objects.create(owner=creator, image='images/%d.jpg' % index)
+            make_event(creator).attenders.add(self.user, *[make_user('guest') for _ in range(friends)])
+
+    def queries(self, path):
+        with CaptureQueriesContext(connection) as context, enforce_query_budgets():
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'] if isinstance(response.data, dict) else response.data)
+        return len(context)
+
+    def assertQueriesPerPage(self, path):
+        self.populate(events=1, friends=1, images=1)
+        self.queries(path)  # Whatever gets loaded once per process.
+        few = self.queries(path)
+        self.populate(events=10, friends=5, images=3)
+        self.assertEqual(self.queries(path), few)
+
+    def test_nearby_events(self):
+        self.assertQueriesPerPage('/events/?lat=13.4&lon=52.5')
+
+    def test_events_by_friends(self):
+        self.assertQueriesPerPage('/events/by_friends/')
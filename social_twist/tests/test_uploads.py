@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from social_twist.models import Upload
+from social_twist.tests.utils import make_user, call
+from social_twist.views.uploads import READ_SIZE, UploadView
+
+
+class ChunkStream(object):
+    """
+    Request body of ``length`` bytes, made up as it's read rather than held in
+    memory. With ``fail_after``, the connection breaks once that much was read.
+    """
+    def __init__(self, length, fail_after=None):
+        self.remaining = length
+        self.fail_after = length if fail_after is None else fail_after
+
+    def read(self, size=-1):
+        if self.fail_after <= 0:
+            raise IOError("Connection reset by peer.")
+        size = min(self.remaining if size is None or size < 0 else size, self.remaining, self.fail_after)
+        self.remaining -= size
+        self.fail_after -= size
+        return b'x' * size
+
+
+class UploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root,
+                                     UPLOAD_PARTIAL_DIR=os.path.join(self.media_root, 'uploads', 'partial'),
+                                     UPLOAD_MAX_CHUNK_SIZE=1024 * 1024 * 1024)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = make_user()
+
+    def start(self, size):
+        response = call(UploadView.as_view({'post': 'create'}), self.user, method='post',
+                        data={'filename': 'video.mp4', 'size': size})
+        self.assertEqual(response.status_code, 201)
+        return Upload.objects.get(pk=response.data['id'])
+
+    def send(self, upload, offset, stream, length):
+        request = APIRequestFactory().generic('PUT', '/', **{
+            'CONTENT_TYPE': 'application/octet-stream',
+            'CONTENT_LENGTH': str(length),
+            'HTTP_UPLOAD_OFFSET': str(offset),
+            'wsgi.input': stream,
+        })
+        force_authenticate(request, user=self.user)
+        response = UploadView.as_view({'put': 'chunk'})(request, pk=str(upload.pk))
+        response.render()
+        return response
+
+    def test_resumes_after_an_interrupted_chunk(self):
+        size = 5 * READ_SIZE + 123
+        upload = self.start(size)
+        broken_at = 2 * READ_SIZE + 7
+
+        response = self.send(upload, 0, ChunkStream(size, fail_after=broken_at), size)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "interrupted", "offset": broken_at})
+
+        response = call(UploadView.as_view({'get': 'retrieve'}), self.user, pk=str(upload.pk))
+        self.assertEqual(response.data['offset'], broken_at)
+
+        response = self.send(upload, 0, ChunkStream(size), size)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data, {"error": "offset_mismatch", "offset": broken_at})
+
+        response = self.send(upload, broken_at, ChunkStream(size - broken_at), size - broken_at)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['offset'], size)
+        upload.refresh_from_db()
+        self.assertTrue(upload.completed)
+        with open(upload.partial_path, 'rb') as partial:
+            self.assertEqual(partial.read(), b'x' * size)
+
+    def test_rejects_malformed_headers(self):
+        upload = self.start(READ_SIZE)
+        for offset in ('abc', '-1', ''):
+            response = self.send(upload, offset, ChunkStream(10), 10)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {"error": "invalid_offset"})
+        response = self.send(upload, 0, ChunkStream(10), 'ten')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "invalid_length"})
+        upload.refresh_from_db()
+        self.assertEqual(upload.offset, 0)
+
+    def test_memory_stays_flat_whatever_the_chunk_size(self):
+        size = 256 * 1024 * 1024
+        upload = self.start(size)
+        tracemalloc.start()
+        try:
+            response = self.send(upload, 0, ChunkStream(size), size)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.path.getsize(upload.partial_path), size)
+        # A few read buffers, nowhere near the size of the chunk.
+        self.assertLess(peak, 16 * READ_SIZE)
@@ -0,0 +1,29 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from social_twist.models import CustomUserData, Event
+
+
+def make_user(name='user'):
+    user = User.objects.create(username='%s_%s' % (name, uuid.uuid4().hex[:8]), first_name=name)
+    user.info = CustomUserData.objects.create(user=user)
+    return user
+
+
+def make_event(creator, title="event", **kwargs):
+    kwargs.setdefault('start_time', timezone.now())
+    return Event.objects.create(title=title, description="description", creator=creator,
+                                coordinates=Point(13.4, 52.5, srid=4326), **kwargs)
+
+
+def call(view, user, path='/', method='get', data=None, headers=None, **kwargs):
+    """Calls a DRF view function as ``user``, returns the rendered response."""
+    request = getattr(APIRequestFactory(), method)(path, data, format='json', **(headers or {}))
+    force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    response.render()
+    return response
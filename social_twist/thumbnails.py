@@ -0,0 +1,40 @@
+"""
+Thumbnails of uploaded pictures.
+
+Every variant below is rendered once, by the ``generate_thumbnails`` job, when a
+picture is saved. Their URLs are stored in the ``thumbnails`` field of the model,
+keyed by variant name (e.g. ``80x80.webp``), so serializers never touch the storage.
+"""
+from imagekit import ImageSpec
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.processors import ResizeToFill
+
+THUMBNAIL_SIZES = (80, 240)
+THUMBNAIL_FORMATS = ('PNG', 'WEBP')
+# The variant served as ``thumbnail`` by the API.
+DEFAULT_THUMBNAIL = '80x80.png'
+
+
+def thumbnail_spec(size, image_format):
+    return type('Thumbnail%d%s' % (size, image_format), (ImageSpec,), {
+        'processors': [ResizeToFill(size, size)],
+        'format': image_format,
+        'options': {'quality': 85},
+    })
+
+
+THUMBNAIL_SPECS = {
+    '%dx%d.%s' % (size, size, image_format.lower()): thumbnail_spec(size, image_format)
+    for size in THUMBNAIL_SIZES
+    for image_format in THUMBNAIL_FORMATS
+}
+
+
+def render_thumbnails(source):
+    """Renders every variant of the ``source`` image file, returns their URLs by variant name."""
+    urls = {}
+    for name, spec in THUMBNAIL_SPECS.items():
+        thumbnail = ImageCacheFile(spec(source=source))
+        thumbnail.generate()
+        urls[name] = thumbnail.url
+    return urls
@@ -21,8 +21,12 @@ from rest_framework_swagger.views import get_swagger_view
 
 from social_twist.views.user import ProfileView, UserView, FriendView,\
     RegisterUser, GalleryView
+from social_twist.views.batch import BatchView
 from social_twist.views.chat import MessageView
 from social_twist.views.events import EventView, InvitationView
+from social_twist.views.metrics import metrics_view
+from social_twist.views.sync import SyncView
+from social_twist.views.uploads import UploadView
 
 router = routers.DefaultRouter()
 router.register(r'events', EventView, base_name="events")
@@ -32,6 +36,9 @@ router.register(r'friends', FriendView, base_name="friends")
 router.register(r'profile', ProfileView, base_name="profile")
 router.register(r'invitations', InvitationView, base_name="invitations")
 router.register(r'gallery', GalleryView, base_name="gallery")
+router.register(r'uploads', UploadView, base_name="uploads")
+router.register(r'sync', SyncView, base_name="sync")
+router.register(r'batch', BatchView, base_name="batch")
 
 schema_view = get_schema_view(title="Many things here")
 docs = get_swagger_view(title='Social Twist API')
@@ -43,4 +50,5 @@ urlpatterns = [
     path('oauth/register/', RegisterUser.as_view()),
     path('schema/', schema_view),
     path('docs/', docs),
+    path('metrics/', metrics_view, name='metrics'),
 ]
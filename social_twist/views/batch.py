@@ -0,0 +1,122 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework import viewsets
+from rest_framework import status
+from rest_framework.response import Response
+
+from social_twist.instrumentation import InstrumentedViewMixin
+from social_twist.models import Event, EventReaction, ChatMessage, Invitation, FriendRequest
+from social_twist.realtime import push
+from social_twist.replicas import ReplicaReadMixin
+
+OPERATIONS = ('like', 'dislike', 'attend', 'unattend', 'seen',
+              'accept_invitation', 'reject_invitation', 'accept_friend', 'reject_friend')
+
+DONE = {"code": 1}
+NOT_FOUND = {"code": -1, "error": "not_found"}
+
+
+def validate(operations):
+    """Errors of a list of operations, by index. An empty dict if they are all fine."""
+    if not isinstance(operations, list):
+        return {'operations': "A list of operations is required."}
+    if len(operations) > settings.BATCH_MAX_OPERATIONS:
+        return {'operations': "At most %d operations are allowed." % settings.BATCH_MAX_OPERATIONS}
+    errors = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            errors[index] = "Unknown operation, expected one of: %s." % ", ".join(OPERATIONS)
+        elif type(operation.get('id')) is not int:
+            errors[index] = "A valid integer id is required."
+    return errors
+
+
+def run(user, operations):
+    """
+    Applies the operations for the user, returns a result for every one of them.
+
+    Reactions, attendance and seen chats are written with a few set-based
+    statements. Operations on the same event take effect in order, the last
+    one wins. Friend requests are answered one by one.
+    """
+    ids = defaultdict(set)
+    for operation in operations:
+        ids[operation['op']].add(operation['id'])
+
+    invitations = dict(Invitation.objects.filter(receiver=user)
+                       .filter(id__in=ids['accept_invitation'] | ids['reject_invitation'])
+                       .values_list('id', 'event_id'))
+    reactions, attendance = {}, {}
+    for operation in operations:
+        op, pk = operation['op'], operation['id']
+        if op in ('like', 'dislike'):
+            reactions[pk] = op == 'like'
+        elif op in ('attend', 'unattend'):
+            attendance[pk] = op == 'attend'
+        elif op == 'accept_invitation' and pk in invitations:
+            attendance[invitations[pk]] = True
+
+    events = set(Event.objects.filter(id__in=set(reactions) | set(attendance)).values_list('id', flat=True))
+    EventReaction.objects.react_many(user, {pk: liked for pk, liked in reactions.items() if pk in events})
+    attend = [pk for pk, going in attendance.items() if going and pk in events]
+    leave = [pk for pk, going in attendance.items() if not going and pk in events]
+    if attend:
+        user.events.add(*attend)
+    if leave:
+        user.events.remove(*leave)
+    if invitations:
+        Invitation.objects.filter(id__in=list(invitations)).delete()
+
+    companions = set(User.objects.filter(id__in=ids['seen']).values_list('id', flat=True))
+    if companions:
+        ChatMessage.objects.mark_seen(user.id, companions)
+        for companion_id in companions:
+            push([user.id, companion_id], 'chat.seen', {'user_id': user.id, 'companion_id': companion_id})
+
+    found = {'like': events, 'dislike': events, 'attend': events, 'unattend': events,
+             'seen': companions, 'accept_invitation': invitations, 'reject_invitation': invitations}
+    results = []
+    for operation in operations:
+        op, pk = operation['op'], operation['id']
+        if op in ('accept_friend', 'reject_friend'):
+            answered = FriendRequest.objects.respond(user, pk, op == 'accept_friend')
+            results.append(DONE if answered else NOT_FOUND)
+        else:
+            results.append(DONE if pk in found[op] else NOT_FOUND)
+    return results
+
+
+class BatchView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ViewSet):
+    def create(self, request):
+        """
+        Applies a list of actions at once, in one transaction,
+        e.g. the ones a client queued while it was offline.
+        - - -
+        Request body:
+        ```
+        {
+            "operations": [
+                {"op": "like", "id": 12},
+                {"op": "seen", "id": 3}
+            ]
+        }
+        ```
+        `op` is one of `like`, `dislike`, `attend` and `unattend` with an event id,
+        `seen` with a companion id, `accept_invitation` and `reject_invitation` with an
+        invitation id, or `accept_friend` and `reject_friend` with a friend request id
+        (rejecting your own request cancels it).\n
+        Operations on the same event take effect in order, the last one wins.
+        The response has a result for every operation, in the same order:
+        `{"code": 1}` when it's done, `{"code": -1, "error": "not_found"}` when
+        there is no such object of yours.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        errors = validate(operations)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            results = run(request.user, operations)
+        return Response({"results": results})
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth.models import User
 from rest_framework.response import Response
@@ -6,11 +7,16 @@ from rest_framework import status
 from rest_framework.decorators import detail_route
 
 
-from social_twist.models import ChatMessage
-from social_twist.serializers import MessageSerializer, PersonWithFriendsSerializer
+from social_twist.instrumentation import InstrumentedViewMixin, query_budget
+from social_twist.jobs import enqueue
+from social_twist.models import ChatMessage, Conversation
+from social_twist.pagination import KeysetPagination
+from social_twist.realtime import push
+from social_twist.replicas import ReplicaReadMixin
+from social_twist.serializers import MessageSerializer, ConversationSerializer
 
 
-class MessageView(viewsets.GenericViewSet):
+class MessageView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.GenericViewSet):
     """
     Get, will get overview of messages
     """
@@ -25,36 +31,21 @@ class MessageView(viewsets.GenericViewSet):
         user = self.request.user
         return ChatMessage.objects.filter(Q(sender=user) | Q(receiver=user))
 
-    @staticmethod
-    def list(request):
+    @query_budget(10)
+    def list(self, request, *args, **kwargs):
         """
         This is an overhead of messages.
         Here in typical fashion of all messengers you'll get list of companions to whom you
-        spoke, and for each of them latest message, that either of you had sent to each other.
+        spoke, and for each of them latest message, that either of you had sent to each other,
+        as well as the number of messages from the companion you haven't seen yet.
         """
-        messages = ChatMessage.objects.filter(Q(sender=request.user.id) | Q(receiver=request.user.id)) \
-            .order_by("-id")
-        serializer = MessageSerializer(messages, many=True)
-        companions = []
-
-        def unique_for_companion(message_in):
-            if request.user.id == message_in['sender_id']:
-                message_in['companion_id'] = message_in['receiver_id']
-            else:
-                message_in['companion_id'] = message_in['sender_id']
-            result_in = False
-            if message_in['companion_id'] not in companions:
-                result_in = True
-                companions.append(message_in['companion_id'])
-            return result_in
-        result = [x for x in serializer.data if unique_for_companion(x)]
-        companions_obj = User.objects.filter(id__in=companions)
-        for message in result:
-            message['companion'] = PersonWithFriendsSerializer(
-                companions_obj.get(id=message['companion_id'])
-            ).data
-            del message['companion_id']
-        return Response(result)
+        queryset = Conversation.objects.filter(owner=request.user,
+                                               last_message__isnull=False)\
+            .order_by('-updated_at')
+        queryset = ConversationSerializer.setup_eager_loading(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = ConversationSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @detail_route(methods=['POST'])
     def send(self, request, pk=None):
@@ -69,7 +60,16 @@ class MessageView(viewsets.GenericViewSet):
         message = ChatMessage(sender=request.user,
                               receiver=receiver,
                               text=request.data.get('text'))
-        message.save()
+        with transaction.atomic():
+            message.save()
+            Conversation.objects.message_sent(message)
+            push([message.sender_id, message.receiver_id], 'chat.message',
+                 MessageSerializer(message).data)
+            enqueue('push_notification', {
+                'user_id': receiver.id,
+                'alert': '%s: %s' % (request.user.get_full_name(), message.text),
+                'data': {'sender_id': request.user.id},
+            }, key='message:%d' % message.id)
         return Response({"code": 1}, status=status.HTTP_201_CREATED)
 
     # @detail_route(methods=['POST'])
@@ -77,31 +77,31 @@ class MessageView(viewsets.GenericViewSet):
     def seen(request, pk=None):
         """Updates all messages in chat to be seen."""
         companion = User.objects.get(pk=pk)
-        messages = ChatMessage.objects.filter(Q(sender=request.user,
-                                                receiver=companion) |
-                                              Q(sender=companion,
-                                                receiver=request.user))\
-            .filter(seen=False)
-        messages.update(seen=True)
+        with transaction.atomic():
+            ChatMessage.objects.mark_seen(request.user.id, [companion.id])
+            push([request.user.id, companion.id], 'chat.seen',
+                 {'user_id': request.user.id, 'companion_id': companion.id})
         return Response({"code": 1})
 
     @staticmethod
-    def retrieve(request, pk=None):
+    def retrieve(request, pk=None, *args, **kwargs):
         """
-        Retrieve chat with a person.
+        Retrieve chat with a person, newest messages first.
         - - -
         Params:\n
 
-        __id__ - companion id, to whom we speak
+        __id__ - companion id, to whom we speak\n
+        __before_id__ - optional, gives messages older than this one\n
+        __after_id__ - optional, gives messages newer than this one\n
+        __limit__ - optional, amount of messages in a page
         """
-        messages = ChatMessage.objects.filter(Q(sender_id=request.user.id,
-                                                receiver_id=pk) |
-                                              Q(sender_id=pk,
-                                                receiver_id=request.user.id))\
-            .order_by("-id")
-        serializer = MessageSerializer(data=messages, many=True)
-        serializer.is_valid()
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset([
+            ChatMessage.objects.filter(sender_id=request.user.id, receiver_id=pk),
+            ChatMessage.objects.filter(sender_id=pk, receiver_id=request.user.id),
+        ], request)
+        serializer = MessageSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     # noinspection PyUnusedLocal
     @staticmethod
@@ -115,6 +115,11 @@ class MessageView(viewsets.GenericViewSet):
         """
         message = ChatMessage.objects.get(pk=int(pk))
         if message.sender == request.user:
-            message.delete()
+            with transaction.atomic():
+                message.delete()
+                Conversation.objects.message_deleted(message)
+                push([message.sender_id, message.receiver_id], 'chat.deleted',
+                     {'id': int(pk), 'sender_id': message.sender_id,
+                      'receiver_id': message.receiver_id})
             return Response({"code": 1})
         return Response({"code": -1}, status=status.HTTP_403_FORBIDDEN)
@@ -1,39 +1,80 @@
-from django.db.models import Q
+import mimetypes
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
 from django.contrib.auth.models import User
+from django.http import HttpResponse
 from rest_framework import viewsets
 from rest_framework import status
 from rest_framework.decorators import list_route, detail_route
 from rest_framework.response import Response
+from django.contrib.gis.db.models.functions import Distance as DistanceTo
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import Distance
 
-from social_twist.models import Event, Invitation, Comment, EventReaction
+from social_twist.caching import cached_response, comments_in, people_in
+from social_twist.instrumentation import InstrumentedViewMixin, query_budget
+from social_twist.jobs import enqueue
+from social_twist.pagination import KeysetPagination
+from social_twist.models import Event, Invitation, Comment, EventReaction, NotificationCounter, \
+    Change, Friendship
+from social_twist.realtime import push
+from social_twist.replicas import ReplicaReadMixin
 from social_twist.serializers import EventSerializer, InvitationSerializer,\
-    PersonWithFriendsSerializer, CommentSerializer
+    SlimPersonSerializer, CommentSerializer, SlimCommentSerializer
 
 
-class EventView(viewsets.ModelViewSet):
+class EventView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(Event.objects.all())
+
     def create(self, request, **kwargs):
         """
         This creates your events.
         The fields should be pretty self explanatory.
-        """
-        result = super(viewsets.ModelViewSet, self).create(request, **kwargs)
-        invites = request.POST.getlist('friends[]', [])
-        event = Event.objects.get(pk=result.data['id'])
-        for friend_id in invites:
-            receiver = User.objects.get(pk=friend_id)
-            invitation = Invitation(sender=request.user,
-                                    receiver=receiver,
-                                    event=event)
-            invitation.save()
-        event.attenders.add(request.user)
+        - - -
+        __friends[]__ - optional array of ids of people to invite.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            invitee_ids = {int(friend_id) for friend_id in request.POST.getlist('friends[]', [])}
+        except ValueError:
+            return Response({"friends[]": ["A valid integer is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            unknown = invitee_ids - set(User.objects.filter(id__in=invitee_ids)
+                                        .values_list('id', flat=True))
+            if unknown:
+                return Response({"friends[]": ["Unknown users: %s." % ", ".join(map(str, sorted(unknown)))]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            self.perform_create(serializer)
+            event = serializer.instance
+            invitations = Invitation.objects.bulk_create(
+                Invitation(sender=request.user, receiver_id=receiver_id, event=event)
+                for receiver_id in invitee_ids
+            )
+            NotificationCounter.objects.add(invitee_ids, invitations=1)
+            Change.objects.record_each(Change.INVITATION, [(invitation.receiver_id, invitation.id)
+                                                           for invitation in invitations])
+            event.attenders.add(request.user)
+            push(invitee_ids, 'invitation', {'event_id': event.id, 'sender_id': request.user.id})
+            for invitation in invitations:
+                enqueue('push_notification', {
+                    'user_id': invitation.receiver_id,
+                    'alert': '%s invites you to %s' % (request.user.get_full_name(), event.title),
+                    'data': {'event_id': event.id},
+                }, key='invitation:%d' % invitation.id)
 
-        return result
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @query_budget(10)
     def list(self, request, *args, **kwargs):
         """
         This gives you a list of events.
@@ -43,7 +84,10 @@ class EventView(viewsets.ModelViewSet):
         __lon__ - longitude\n
         __radius__ - radius in km from the point specified.\n
         __categories__ - optional array of categories to be filtered against.\n
-        These 3 params together provide geographical filtering for the events.
+        __sort__ - optional, `distance` sorts the events nearest first,
+        otherwise they come ordered by start time.\n
+        These 3 params together provide geographical filtering for the events,
+        each event also gets the __distance__ in km from the point.
         As the server is using SRID 4326 for calculating distances, specification is needed:\n
         -180 <= __lat__ <= 0 for the Western hemisphere
         and 0 <= __lat__ <= 180 for the Eastern one.\n
@@ -53,6 +97,8 @@ class EventView(viewsets.ModelViewSet):
         - - -
         Additional optional parameter is:\n
         __text__ - which enables a full text search through event fields.
+        Titles are also matched by similarity, so typos are forgiven.
+        Unless sorted by distance, best matches come first.
         """
         queryset = self.get_queryset()
         lat = float(request.GET.get('lat', 0))
@@ -60,22 +106,33 @@ class EventView(viewsets.ModelViewSet):
         radius = int(request.GET.get('radius', 10))
         text = request.GET.get('text')
         categories = request.GET.getlist('categories[]')
-        point = Point(lat, lon)
-        queryset = queryset.filter(coordinates__distance_lte=(point, Distance(km=radius)))
+        point = Point(lat, lon, srid=4326)
+        # On geography ST_DWithin prefilters with the GiST index by bounding box
+        # and only then computes exact distances.
+        queryset = queryset.filter(coordinates__dwithin=(point, Distance(km=radius)))\
+            .annotate(distance=DistanceTo('coordinates', point))
         queryset = queryset.filter(Q(is_private=False) |
-                                   Q(creator__in=request.user.info.friends.all()))
+                                   Q(creator__in=self.friend_ids(request.user)))
         if text is not None:
-            queryset = queryset.filter(Q(title__icontains=text) |
-                                       Q(description__icontains=text) |
-                                       Q(location__icontains=text) |
-                                       Q(creator__first_name__icontains=text) |
-                                       Q(creator__last_name__icontains=text))
+            query = SearchQuery(text)
+            queryset = queryset.filter(Q(search_vector=query) |
+                                       Q(title__trigram_similar=text))\
+                .annotate(rank=SearchRank('search_vector', query) +
+                          TrigramSimilarity('title', text))\
+                .order_by('-rank', '-start_time')
         if len(categories) != 0:
             queryset = queryset.filter(type__in=categories)
+        if request.GET.get('sort') == 'distance':
+            queryset = queryset.order_by('distance', 'id')
         queryset = self.paginate_queryset(queryset)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @staticmethod
+    def friend_ids(user):
+        """Subquery of the ids of the user's friends, read off the friendship index."""
+        return Friendship.objects.filter(user=user).values('friend_id')
+
     def partial_update(self, request, pk=None, *args, **kwargs):
         """
         This is how you should update the event.
@@ -89,20 +146,32 @@ class EventView(viewsets.ModelViewSet):
         return result
 
     @list_route()
+    @query_budget(10)
     def by_friends(self, request):
         """
-        Shows events that were created by friends of the current user.
-        """
-        queryset = Event.objects.filter(creator__in=request.user.info.friends.all())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        Shows events that were created by friends of the current user, newest first.
+        - - -
+        Paginated by the optional params:\n
+        __limit__ - amount of events per page\n
+        __before_id__ - only events older than this one\n
+        __after_id__ - only events newer than this one
+        """
+        # Most events are in the feed, the ones of people with lots of friends are read
+        # straight from the event table.
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset([
+            self.get_queryset().filter(feed_items__user=request.user),
+            self.get_queryset().filter(creator__in=self.friend_ids(request.user), fanned_out=False),
+        ], request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @list_route()
     def by_me(self, request):
         """
         Shows events that were created by the current user.
         """
-        queryset = Event.objects.filter(creator=request.user)
+        queryset = self.get_queryset().filter(creator=request.user)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -120,16 +189,58 @@ class EventView(viewsets.ModelViewSet):
         return Response({"code": -1}, status=status.HTTP_403_FORBIDDEN)
 
     @detail_route()
-    def attenders(self, _, pk=None):
+    def video(self, request, pk=None):
         """
-        Returns a list of users that are going to the event specified.
+        Streams the video of the event. Range requests are supported,
+        the file itself is served by nginx.
         - - -
         Param:
         __id__ - of the event that we are interested in.
         """
+        event = Event.objects.filter(Q(is_private=False) |
+                                     Q(creator=request.user) |
+                                     Q(attenders=request.user), pk=pk).first()
+        if event is None or not event.video:
+            return Response({"code": -1}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(content_type=mimetypes.guess_type(event.video.name)[0] or
+                                'application/octet-stream')
+        response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_URL + event.video.name
+        return response
+
+    @staticmethod
+    def is_friend(user, person_ref):
+        return Exists(Friendship.objects.filter(user=user, friend=OuterRef(person_ref)))
+
+    @staticmethod
+    def total(queryset, group_by):
+        """Count of the queryset, to be annotated, computed just once per query."""
+        counts = queryset.order_by().values(group_by).annotate(count=Count('*')).values('count')
+        return Subquery(counts, output_field=IntegerField())
+
+    @detail_route()
+    @query_budget(10)
+    @cached_response('event:{pk}', 'friends:{me}', depends=people_in)
+    def attenders(self, request, pk=None):
+        """
+        Returns the users that are going to the event specified, by descending id,
+        with whether each of them is your friend, and how many there are in `count`.
+        - - -
+        Param:
+        __id__ - of the event that we are interested in.\n
+        Paginated by the optional params:\n
+        __limit__ - amount of people per page\n
+        __before_id__ - only people listed after this one\n
+        __after_id__ - only people listed before this one
+        """
         event = Event.objects.get(pk=pk)
-        serializer = PersonWithFriendsSerializer(event.attenders, many=True)
-        return Response(serializer.data)
+        attendance = Event.attenders.through.objects.filter(event=event)
+        queryset = SlimPersonSerializer.setup_eager_loading(User.objects.filter(events=event))\
+            .annotate(is_friend=self.is_friend(request.user, 'pk'),
+                      total=self.total(attendance, 'event_id'))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        count = page[0].total if page else attendance.count()
+        return paginator.get_paginated_response(SlimPersonSerializer(page, many=True).data, count=count)
 
     @detail_route(methods=['post'])
     def attend(self, request, pk=None):
@@ -151,18 +262,7 @@ class EventView(viewsets.ModelViewSet):
         Param:
         __id__ - of the event that we are interested in.
         """
-        event = Event.objects.get(pk=pk)
-        event_reaction = EventReaction.objects.get_or_create(event=event,
-                                                             person=request.user)[0]
-        if event_reaction.liked:
-            return Response({"code": 1})
-        if event_reaction.disliked:
-            event.dislikes -= 1
-            event_reaction.disliked = False
-        event_reaction.liked = True
-        event.likes += 1
-        event.save()
-        event_reaction.save()
+        EventReaction.objects.react(request.user, int(pk), liked=True)
         return Response({"code": 1})
 
     @detail_route(methods=['post'])
@@ -173,18 +273,7 @@ class EventView(viewsets.ModelViewSet):
         Param:
         __id__ - of the event that we are interested in.
         """
-        event = Event.objects.get(pk=pk)
-        event_reaction = EventReaction.objects.get_or_create(event=event,
-                                                             person=request.user)[0]
-        if event_reaction.disliked:
-            return Response({"code": 1})
-        if event_reaction.liked:
-            event.likes -= 1
-            event_reaction.liked = False
-        event_reaction.disliked = True
-        event.dislikes += 1
-        event.save()
-        event_reaction.save()
+        EventReaction.objects.react(request.user, int(pk), liked=False)
         return Response({"code": 1})
 
     @detail_route(methods=['post'])
@@ -207,22 +296,38 @@ class EventView(viewsets.ModelViewSet):
         return Response(CommentSerializer(comment).data, 201)
 
     @detail_route()
-    def comments(self, _, pk=None):
+    @query_budget(10)
+    @cached_response('event:{pk}', 'friends:{me}', depends=comments_in)
+    def comments(self, request, pk=None):
         """
-        Get comments for the given event.
+        Get comments for the given event, newest first,
+        with whether each author is your friend, and how many there are in `count`.
         - - -
         Param:
-        __id__ - of the event that we are interested in.
+        __id__ - of the event that we are interested in.\n
+        Paginated by the optional params:\n
+        __limit__ - amount of comments per page\n
+        __before_id__ - only comments older than this one\n
+        __after_id__ - only comments newer than this one
         """
         event = Event.objects.get(pk=pk)
-        queryset = event.comment_set
-        return Response(CommentSerializer(queryset, many=True).data)
+        comments = event.comment_set.all()
+        queryset = SlimCommentSerializer.setup_eager_loading(comments)\
+            .annotate(author_is_friend=self.is_friend(request.user, 'author_id'),
+                      total=self.total(Comment.objects.filter(event=event), 'event_id'))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        count = page[0].total if page else comments.count()
+        return paginator.get_paginated_response(SlimCommentSerializer(page, many=True).data, count=count)
 
 
-class InvitationView(viewsets.ModelViewSet):
+class InvitationView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Invitation.objects.all()
     serializer_class = InvitationSerializer
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(Invitation.objects.all())
+
     def create(self, request, **kwargs):
         """
         Creates an invitation for user to join in to a event.
@@ -240,6 +345,7 @@ class InvitationView(viewsets.ModelViewSet):
         return Response(InvitationSerializer(invitation).data,
                         status=status.HTTP_201_CREATED)
 
+    @query_budget(10)
     def list(self, request, *args, **kwargs):
         """
         Lists all event invitations for the user.
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.http import HttpResponse, Http404
+from django.utils.crypto import constant_time_compare
+
+from social_twist.instrumentation import metrics, prometheus_text
+
+
+def metrics_view(request):
+    """
+    Request metrics in the Prometheus text format. Scrapers authenticate with
+    ``Authorization: Bearer <METRICS_TOKEN>``, without a token configured there's nothing here.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                              'Bearer %s' % token):
+        raise Http404
+    return HttpResponse(prometheus_text(metrics.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
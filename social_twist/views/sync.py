@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import Q
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from social_twist.instrumentation import InstrumentedViewMixin, query_budget
+from social_twist.models import Change, Event, ChatMessage, Invitation
+from social_twist.replicas import ReplicaReadMixin, read_from_primary
+from social_twist.serializers import EventSerializer, MessageSerializer, InvitationSerializer,\
+    FriendSerializer
+
+TOKEN_SALT = 'social_twist.sync'
+
+SERIALIZERS = {
+    Change.EVENT: (Event, EventSerializer, 'events'),
+    Change.MESSAGE: (ChatMessage, MessageSerializer, 'messages'),
+    Change.INVITATION: (Invitation, InvitationSerializer, 'invitations'),
+    Change.FRIEND: (User, FriendSerializer, 'friends'),
+}
+
+
+def make_token(txid, change_id):
+    return signing.dumps({'txid': txid, 'id': change_id}, salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """
+    (txid, id) of the last change the client has seen, in the order of
+    ``Change`` replays, None if the token is bad or too old.
+    """
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.SYNC_RETENTION_DAYS * 24 * 60 * 60)
+        return data['txid'], data['id']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+class SyncView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ViewSet):
+    @query_budget(20)
+    @read_from_primary
+    def list(self, request):
+        """
+        Returns what changed for the current user since the last sync.
+        - - -
+        Params:
+        __token__ - optional, the token returned by the previous sync.\n
+        Without a token, or with one older than the change log goes back,
+        the response only has `reset` set and a fresh token:
+        the client should download its lists again and sync from there on.
+        Otherwise the response has the `events`, `messages`, `invitations` and `friends`
+        that were added or changed, and the ids of the deleted ones in `deleted`.
+        While `has_more` is set, sync again with the new token right away.
+        """
+        user = request.user
+        last = read_token(request.GET.get('token', ''))
+        # Changes of transactions still running could later show up before the
+        # ones listed now, they wait until every older transaction is done.
+        horizon = Change.objects.horizon()
+        if last is None:
+            # Whatever the client downloads next may miss them too.
+            return Response({'reset': True, 'token': make_token(horizon, 0)})
+
+        last_txid, last_id = last
+        batch = settings.SYNC_BATCH_SIZE
+        changes = list(Change.objects.filter(Q(txid__gt=last_txid) | Q(txid=last_txid, id__gt=last_id),
+                                             user=user, txid__lt=horizon)
+                       .order_by('txid', 'id')
+                       .values_list('txid', 'id', 'kind', 'object_id', 'deleted')[:batch + 1])
+        has_more = len(changes) > batch
+        changes = changes[:batch]
+
+        # Only the latest change of every object matters.
+        latest = {}
+        for _, _, kind, object_id, deleted in changes:
+            latest[kind, object_id] = deleted
+
+        data = {'reset': False,
+                'token': make_token(*changes[-1][:2]) if changes else make_token(last_txid, last_id),
+                'has_more': has_more,
+                'deleted': {}}
+        context = {'request': request}
+        for kind, (model, serializer_class, key) in SERIALIZERS.items():
+            changed = [object_id for (k, object_id), deleted in latest.items() if k == kind and not deleted]
+            deleted = {object_id for (k, object_id), deleted in latest.items() if k == kind and deleted}
+            queryset = serializer_class.setup_eager_loading(model.objects.filter(id__in=changed))
+            objects = list(queryset)
+            # Whatever is gone by now was deleted after the change got logged.
+            deleted.update(set(changed) - {obj.id for obj in objects})
+            data[key] = serializer_class(objects, many=True, context=context).data
+            data['deleted'][key] = sorted(deleted)
+        return Response(data)
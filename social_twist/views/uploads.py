@@ -0,0 +1,143 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework import mixins
+from rest_framework import status
+from rest_framework import viewsets
+from rest_framework.decorators import detail_route
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from social_twist.caching import bump_on_commit
+from social_twist.instrumentation import InstrumentedViewMixin
+from social_twist.models import Change, Event, Upload
+from social_twist.replicas import ReplicaReadMixin
+from social_twist.serializers import UploadSerializer
+
+READ_SIZE = 64 * 1024
+
+
+def parse_size(value):
+    """A non-negative number of bytes sent in a header, None if it isn't one."""
+    try:
+        size = int(value)
+    except ValueError:
+        return None
+    return size if size >= 0 else None
+
+
+class UploadView(InstrumentedViewMixin, ReplicaReadMixin, mixins.CreateModelMixin,
+                 mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """
+    Resumable, chunked uploads of big files, e.g. event videos.
+    Start one with POST, send chunks in order with PUT to `chunk`,
+    and attach the complete file to an event with POST to `video`.
+    If the connection breaks, GET the upload to find out where to resume.
+    """
+    serializer_class = UploadSerializer
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        upload = serializer.save(owner=self.request.user)
+        os.makedirs(settings.UPLOAD_PARTIAL_DIR, exist_ok=True)
+        open(upload.partial_path, 'wb').close()
+
+    @detail_route(methods=['PUT'])
+    def chunk(self, request, pk=None):
+        """
+        Appends a chunk to the upload. The request body is the raw chunk.
+        - - -
+        Params:\n
+
+        __id__ - of the upload.\n
+        __Upload-Offset__ - header, where in the file the chunk starts,
+        has to match the `offset` of the upload.
+        """
+        length = parse_size(request.META.get('CONTENT_LENGTH') or '0')
+        if length is None:
+            return Response({"error": "invalid_length"}, status=status.HTTP_400_BAD_REQUEST)
+        offset = request.META.get('HTTP_UPLOAD_OFFSET')
+        if offset is not None:
+            offset = parse_size(offset)
+            if offset is None:
+                return Response({"error": "invalid_offset"}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+            return Response({"error": "chunk_too_large",
+                             "max_size": settings.UPLOAD_MAX_CHUNK_SIZE},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(pk=pk)
+            if offset != upload.offset:
+                return Response({"error": "offset_mismatch", "offset": upload.offset},
+                                status=status.HTTP_409_CONFLICT)
+            if upload.offset + length > upload.size:
+                return Response({"error": "chunk_exceeds_size", "offset": upload.offset},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                written = self.write_chunk(upload, request.stream, length)
+            except IOError:
+                written = None
+            # Whatever made it to the disk counts, so an interrupted
+            # chunk resumes right where it broke off.
+            upload.save(update_fields=['offset'])
+        if written != length:
+            return Response({"error": "interrupted", "offset": upload.offset},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data)
+
+    @staticmethod
+    def write_chunk(upload, stream, length):
+        """
+        Streams the chunk to the partial file, never holding more than READ_SIZE
+        in memory. Returns the number of bytes written.
+        """
+        written = 0
+        if stream is None:
+            return written
+        with open(upload.partial_path, 'r+b') as partial:
+            partial.seek(upload.offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                partial.write(data)
+                partial.flush()
+                upload.offset += len(data)
+                written += len(data)
+        return written
+
+    @detail_route(methods=['POST'])
+    def video(self, request, pk=None):
+        """
+        Makes a complete upload the video of your event.
+        - - -
+        Params:\n
+
+        __id__ - of the upload.\n
+        __event_id__ - of the event.
+        """
+        upload = self.get_object()
+        if not upload.completed:
+            return Response({"error": "incomplete_upload", "offset": upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        event = Event.objects.filter(pk=request.data.get('event_id'), creator=request.user).first()
+        if event is None:
+            return Response({"code": -1}, status=status.HTTP_403_FORBIDDEN)
+        filename = default_storage.get_valid_name(os.path.basename(upload.filename))
+        name = default_storage.get_available_name(os.path.join('videos', filename))
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Same filesystem, so this is a rename rather than a copy.
+        os.replace(upload.partial_path, path)
+        with transaction.atomic():
+            Event.objects.filter(pk=event.pk).update(video=name)
+            Change.objects.record_events([event.pk])
+            bump_on_commit('event:%d' % event.pk)
+        upload.delete()
+        video_url = reverse('events-video', kwargs={'pk': event.pk}, request=request)
+        return Response({"code": 1, "video": video_url})
@@ -1,10 +1,10 @@
 import datetime
-import random
-import string
 
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import transaction
 from django.db.models import Q
-from django.core.mail import send_mail
+from django.db.models.functions import Greatest
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import detail_route, list_route, api_view, permission_classes
@@ -12,16 +12,25 @@ from rest_framework import mixins
 from rest_framework import status
 from rest_framework import permissions
 from rest_framework.generics import CreateAPIView
+from rest_framework.settings import api_settings
 
+from social_twist.caching import cached_response, events_in, people_in
+from social_twist.friends import graph
+from social_twist.instrumentation import InstrumentedViewMixin, query_budget
+from social_twist.jobs import enqueue
+from social_twist.replicas import ReplicaReadMixin, read_from_primary
 from social_twist.models import (
     FriendRequest,
+    Friendship,
     Event,
     EventReaction,
     ChatMessage,
     Invitation,
+    NotificationCounter,
 )
 from social_twist.serializers import (
     UserSerializer,
+    PersonSerializer,
     EventSerializer,
     FriendRequestSerializer,
     FriendSerializer,
@@ -31,7 +40,7 @@ from social_twist.serializers import (
 )
 
 
-class RegisterUser(CreateAPIView):
+class RegisterUser(InstrumentedViewMixin, ReplicaReadMixin, CreateAPIView):
     model = User
     permission_classes = [
         permissions.AllowAny  # Or anon users can't register
@@ -39,9 +48,20 @@ class RegisterUser(CreateAPIView):
     serializer_class = UserSerializer
 
 
-def generate_password(length=8):
-    choices = string.digits + string.ascii_lowercase + string.ascii_uppercase
-    return ''.join([random.choice(choices) for _ in range(length)])
+def search_people(queryset, name):
+    """
+    Filters people whose first or last name starts with, or is similar to, the name.
+    Best matches come first. Both kinds of match are served by trigram indexes.
+    """
+    if not name:
+        return queryset.order_by('first_name', 'last_name', 'id')
+    return queryset.filter(Q(first_name__istartswith=name) |
+                           Q(last_name__istartswith=name) |
+                           Q(first_name__trigram_similar=name) |
+                           Q(last_name__trigram_similar=name))\
+        .annotate(similarity=Greatest(TrigramSimilarity('first_name', name),
+                                      TrigramSimilarity('last_name', name)))\
+        .order_by('-similarity', 'id')
 
 
 @api_view(['POST'])
@@ -52,20 +72,13 @@ def reset_password(request):
     except User.DoesNotExist:
         return Response({"error": "incorrect_email",
                          "error_description": "Can't find a user with such email."}, status=404)
-    password = generate_password()
-    user.set_password(password)
-    send_mail(
-        'Your new social twist password',
-        'Here is your new social twist password: %s\nPlease reset it at the first convenient moment.' % password,
-        'staff@social_twist.com',
-        [request.data['email']],
-        fail_silently=False,
-    )
+    # The new password is only made up when the job runs, so that it's never stored.
+    enqueue('reset_password', {'user_id': user.id})
 
     return Response({"msg": "ok"})
 
 
-class ProfileView(mixins.UpdateModelMixin,
+class ProfileView(InstrumentedViewMixin, ReplicaReadMixin, mixins.UpdateModelMixin,
                   mixins.CreateModelMixin,
                   viewsets.GenericViewSet):
     serializer_class = UserSerializer
@@ -99,7 +112,7 @@ class ProfileView(mixins.UpdateModelMixin,
         before = request.GET.get('before')
         if before is not None:
             queryset = queryset.filter(start_time__lte=before)
-        serializer = EventSerializer(queryset, many=True)
+        serializer = EventSerializer(EventSerializer.setup_eager_loading(queryset.all()), many=True)
         return Response(serializer.data)
 
     @detail_route(methods=['DELETE'])
@@ -119,25 +132,33 @@ class ProfileView(mixins.UpdateModelMixin,
     def notifications(self, request):
         """
         Gets all your notifications, to be displayed as in Facebook for example.
+        - - -
+        Every list is paginated by the same optional params:\n
+        __limit__ - amount of entries in each list\n
+        __offset__ - how many entries of each list to skip
         """
-        received_messages = ChatMessage.objects.filter(receiver=request.user,
-                                                       seen=False)
-        chatters = User.objects.filter(
-            id__in=received_messages.values('sender_id')
-        )
-        serialized_chatters = PersonWithFriendsSerializer(chatters, many=True)
+        limit = self.paginator.get_limit(request)
+        offset = self.paginator.get_offset(request)
+        window = slice(offset, offset + limit)
 
+        chatters = User.objects.filter(
+            id__in=ChatMessage.objects.filter(receiver=request.user, seen=False).values('sender_id')
+        ).order_by('id')
         invitations = Invitation.objects.filter(receiver=request.user)
-        serialized_invitators = InvitationSerializer(invitations, many=True)
+        requesters = User.objects.filter(
+            id__in=FriendRequest.objects.filter(receiver=request.user, seen=False).values('sender_id')
+        ).order_by('id')
 
-        friend_requests = FriendRequest.objects.filter(receiver=request.user,
-                                                       seen=False)
-        requesters = User.objects.filter(id__in=friend_requests.values('sender_id'))
-        serialized_requesters = PersonWithFriendsSerializer(requesters, many=True)
         result = {
-            'messages': serialized_chatters.data,
-            'invitations': serialized_invitators.data,
-            'friend_requests': serialized_requesters.data
+            'messages': PersonWithFriendsSerializer(
+                PersonWithFriendsSerializer.setup_eager_loading(chatters)[window], many=True
+            ).data,
+            'invitations': InvitationSerializer(
+                InvitationSerializer.setup_eager_loading(invitations)[window], many=True
+            ).data,
+            'friend_requests': PersonWithFriendsSerializer(
+                PersonWithFriendsSerializer.setup_eager_loading(requesters)[window], many=True
+            ).data,
         }
         return Response(result)
 
@@ -146,19 +167,36 @@ class ProfileView(mixins.UpdateModelMixin,
         """
         This returns count of notifications to be display, as it does in Facebook for example.
         """
-        result = {
-            'messages': ChatMessage.objects.filter(receiver=request.user, seen=False).count(),
-            'invitations': Invitation.objects.filter(receiver=request.user, seen=False).count(),
-            'friend_requests': FriendRequest.objects.filter(receiver=request.user, seen=False).count()
-        }
-        return Response(result)
+        counter = NotificationCounter.objects.filter(user=request.user)\
+            .values('messages', 'invitations', 'friend_requests')\
+            .first()
+        return Response(counter or {'messages': 0, 'invitations': 0, 'friend_requests': 0})
 
 
-class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+class UserView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = User.objects.all()
     serializer_class = PersonWithFriendsSerializer
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(User.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a user, with whether they are your friend in `is_friend`
+        and how many friends you have in common in `mutual_friends`.
+        - - -
+        Params:\n
+
+        __id__ - Target user id.
+        """
+        response = super(UserView, self).retrieve(request, *args, **kwargs)
+        person_id = response.data['id']
+        response.data['is_friend'] = graph.are_friends(request.user.id, person_id)
+        response.data['mutual_friends'] = graph.mutual_count(request.user.id, person_id)
+        return response
+
     @detail_route()
+    @cached_response('activity:{pk}', depends=events_in)
     def attends(self, _, pk=None):
         """
         Retrieve a list of events which target user attends.
@@ -169,10 +207,12 @@ class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         """
         user = User.objects.get(pk=int(pk))
         day_ago = datetime.datetime.now() - datetime.timedelta(days=1)
-        serializer = EventSerializer(user.events.filter(start_time__gte=day_ago), many=True)
+        queryset = EventSerializer.setup_eager_loading(user.events.filter(start_time__gte=day_ago))
+        serializer = EventSerializer(queryset, many=True)
         return Response(serializer.data)
 
     @detail_route()
+    @cached_response('activity:{pk}', depends=events_in)
     def likes(self, _, pk=None):
         """
         Retrieve a list of events which target user liked.
@@ -182,12 +222,14 @@ class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         __id__ - Target user id.
         """
         user = User.objects.get(pk=int(pk))
-        reactions = EventReaction.objects.filter(user=user, liked=True)
+        reactions = EventReaction.objects.filter(person=user, liked=True)
         events = Event.objects.filter(id__in=reactions.values_list('event_id', flat=True))
+        events = EventSerializer.setup_eager_loading(events)
         serializer = EventSerializer(events, many=True)
         return Response(serializer.data)
 
     @detail_route()
+    @cached_response('activity:{pk}', depends=events_in)
     def created(self, _, pk=None):
         """
         Retrieve a list of events which target user liked.
@@ -197,7 +239,8 @@ class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         __id__ - Target user id.
         """
         user = User.objects.get(pk=int(pk))
-        serializer = EventSerializer(user.owned_events, many=True)
+        queryset = EventSerializer.setup_eager_loading(user.owned_events.all())
+        serializer = EventSerializer(queryset, many=True)
         return Response(serializer.data)
 
     @detail_route(methods=['POST'])
@@ -210,8 +253,14 @@ class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         __id__ - Target user id.
         """
         user = User.objects.get(pk=int(pk))
-        FriendRequest.objects.get_or_create(sender=request.user,
-                                            receiver=user)
+        friend_request, created = FriendRequest.objects.get_or_create(sender=request.user,
+                                                                      receiver=user)
+        if created:
+            enqueue('push_notification', {
+                'user_id': user.id,
+                'alert': '%s wants to be your friend' % request.user.get_full_name(),
+                'data': {'friend_request_id': friend_request.id},
+            }, key='friend_request:%d' % friend_request.id)
         return Response({"code": 1})
 
     @list_route()
@@ -222,16 +271,21 @@ class UserView(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         Params:\n
 
         __name__ - sent as GET param, against this users will be filtered.
+        Names are matched by prefix and by similarity, best matches first.
+        Every person comes with the number of friends you have in common, `mutual_friends`.
         """
-        name = request.GET.get("name", "")
-        queryset = self.get_queryset().filter(Q(first_name__contains=name) |
-                                              Q(last_name__contains=name))
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = search_people(User.objects.all(), request.GET.get("name", ""))
+        page = self.paginate_queryset(PersonSerializer.setup_eager_loading(queryset))
+        data = PersonSerializer(page, many=True).data
+        mutual = graph.mutual_counts(request.user.id, [person['id'] for person in data])
+        for person in data:
+            person['mutual_friends'] = mutual[person['id']]
+        return self.get_paginated_response(data)
 
 
-class FriendView(viewsets.ViewSet):
+class FriendView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ViewSet):
     @list_route()
+    @read_from_primary
     def requests(self, request):
         """
         Gets all friend requests that target current user.
@@ -239,17 +293,22 @@ class FriendView(viewsets.ViewSet):
         """
         friend_requests = FriendRequest.objects.filter(receiver=request.user)
         # TODO Check the impact
-        friend_requests.update(seen=True)
+        with transaction.atomic():
+            friend_requests.update(seen=True)
+            NotificationCounter.objects.reset(request.user.id, 'friend_requests')
+        friend_requests = FriendRequestSerializer.setup_eager_loading(friend_requests)
         serializer = FriendRequestSerializer(friend_requests, many=True)
         return Response(serializer.data)
 
     # noinspection PyUnusedLocal
-    @staticmethod
-    def list(request, *args, **kwargs):
+    @query_budget(10)
+    @cached_response('user:{me}', depends=people_in)
+    def list(self, request, *args, **kwargs):
         """
         Returns all your friends.
         """
-        serializer = FriendSerializer(request.user.info.friends, many=True)
+        queryset = FriendSerializer.setup_eager_loading(request.user.info.friends.all())
+        serializer = FriendSerializer(queryset, many=True)
         return Response(serializer.data)
 
     @detail_route(methods=['DELETE'])
@@ -262,8 +321,7 @@ class FriendView(viewsets.ViewSet):
         __id__ - friend id, who is to be removed
         """
         user = User.objects.get(pk=int(pk))
-        request.user.info.friends.remove(user)
-        user.info.friends.remove(request.user)
+        Friendship.objects.unfriend(request.user, user)
         return Response({"code": 1})
 
     @detail_route(methods=['POST'])
@@ -301,17 +359,33 @@ class FriendView(viewsets.ViewSet):
 
     @staticmethod
     def react_to_invitation(request, pk, accept=False):
-        friend_request = FriendRequest.objects.get(pk=int(pk))
-        if friend_request.receiver == request.user\
-                or friend_request.sender == request.user:
-            if accept:
-                request.user.info.friends.add(friend_request.sender)
-                friend_request.sender.info.friends.add(request.user)
-            friend_request.delete()
+        if FriendRequest.objects.respond(request.user, int(pk), accept):
             # TODO notify the sender!
             return Response({"code": 1})
         return Response({"code": -1}, status=status.HTTP_403_FORBIDDEN)
 
+    @list_route()
+    def suggestions(self, request):
+        """
+        Suggests people you may know: friends of your friends,
+        the ones you have most mutual friends with first.
+        - - -
+        Params:\n
+
+        __limit__ - optional, how many people to suggest.
+        """
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        suggested = graph.suggestions(request.user.id, limit=paginator.get_limit(request))
+        people = PersonSerializer.setup_eager_loading(User.objects.filter(id__in=[pk for pk, _ in suggested]))
+        people = {person.id: person for person in people}
+        result = []
+        for pk, mutual_friends in suggested:
+            if pk in people:
+                data = PersonSerializer(people[pk]).data
+                data['mutual_friends'] = mutual_friends
+                result.append(data)
+        return Response(result)
+
     @list_route()
     def search(self, request):
         """
@@ -320,17 +394,17 @@ class FriendView(viewsets.ViewSet):
         Params:\n
 
         __name__ - sent as GET param, against this friends will be filtered.
+        Names are matched by prefix and by similarity, best matches first.
         """
-        name = request.GET.get("name", "")
-        queryset = request.user.info.friends.filter(
-            Q(first_name__contains=name) |
-            Q(last_name__contains=name)
-        )
-        serializer = FriendSerializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = search_people(request.user.info.friends.all(), request.GET.get("name", ""))
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+        page = paginator.paginate_queryset(PersonSerializer.setup_eager_loading(queryset),
+                                           request, view=self)
+        serializer = PersonSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class GalleryView(viewsets.GenericViewSet,
+class GalleryView(InstrumentedViewMixin, ReplicaReadMixin, viewsets.GenericViewSet,
                   mixins.CreateModelMixin,
                   mixins.DestroyModelMixin):
     """